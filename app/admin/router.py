@@ -0,0 +1,229 @@
+from datetime import date
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import session_scope, get_read_session
+from app.slow_queries import slow_query_log
+from app.models import WORKER_USER_TYPE, ServiceType, ClientType, BudgetType, DeadlineType
+from app.web.cache import catalog_cache
+from app.web.db_manager import ProjectDBM, ImageDBM, UserDBM, ApplicationDBM, ApplicationStatDBM, AssignmentDBM
+from app.web.export import export_ndjson, export_csv
+from app.web.response_cache import stats_cache
+from app.web.utils import encode_cursor, decode_cursor
+from app.web.uploads import ImageUpload
+from config import admin_settings, upload_settings
+
+
+async def verify_admin_token(x_admin_token: str | None = Header(default=None)) -> None:
+    # admin API is disabled completely while no token is configured
+    if not admin_settings.ADMIN_TOKEN or x_admin_token != admin_settings.ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token",
+        )
+
+
+# creating router, every endpoint requires admin token
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+
+# get recorded slow queries, newest first
+@router.get("/slow-queries")
+async def get_slow_queries():
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "entries": list(reversed(slow_query_log.entries)),
+    }
+
+
+# applications contain personal data of clients, they are listed, exported and counted by admins only
+@router.get("/applications/export")
+async def export_applications(
+        export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+        status_label: str | None = None,
+        service_type_id: int | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None
+):
+    # rows are streamed from server-side cursor straight to the client, nothing is buffered
+    filters = {
+        "status_label": status_label,
+        "service_type_id": service_type_id,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    if export_format == "csv":
+        content, media_type = export_csv(**filters), "text/csv"
+    else:
+        content, media_type = export_ndjson(**filters), "application/x-ndjson"
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="applications.{export_format}"'}
+    )
+
+
+# counts of applications by catalogs and status, and daily volumes, optionally for a period
+@router.get("/applications/stats")
+async def get_application_stats(
+        request: Request,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        session: AsyncSession = Depends(get_read_session)
+):
+    # summed from counters maintained together with applications, not from applications themselves
+    cached = stats_cache.get(request)
+    if cached:
+        return stats_cache.respond(request, cached)
+
+    stats = await ApplicationStatDBM.summary(date_from=date_from, date_to=date_to, session=session)
+    # catalog dimensions are counted by ids, names are taken from in-memory catalog cache
+    for dimension, model in (
+            ("service_type", ServiceType),
+            ("client_type", ClientType),
+            ("budget_type", BudgetType),
+            ("deadline_type", DeadlineType)
+    ):
+        names = await catalog_cache.get_names(model)
+        stats["counts"][dimension] = {
+            names.get(int(key), key): count for key, count in stats["counts"][dimension].items()
+        }
+    return stats_cache.respond(request, stats_cache.put(request, jsonable_encoder(stats)))
+
+
+# recount statistics from applications, e.g. after rollout, when previous instances wrote applications without counting
+@router.post("/applications/stats/rebuild")
+async def rebuild_application_stats():
+    async with session_scope() as session:
+        total = await ApplicationStatDBM.rebuild(session=session)
+    return {"success": True, "total": total}
+
+
+@router.get("/applications")
+async def get_app(
+        limit: int = Query(default=50, ge=1, le=500),
+        cursor: str | None = None,
+        status_label: str | None = None,
+        service_type_id: int | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        session: AsyncSession = Depends(get_read_session)
+):
+    # keyset pagination -> cost of a page does not depend on its position or size of the table
+    applications, next_cursor = await ApplicationDBM.find_page(
+        limit=limit,
+        cursor=await decode_cursor(cursor) if cursor else None,
+        session=session,
+        status_label=status_label,
+        service_type_id=service_type_id,
+        date_from=date_from,
+        date_to=date_to
+    )
+
+    return {
+        "items": applications,
+        "next_cursor": await encode_cursor(next_cursor) if next_cursor else None,
+    }
+
+
+# upload image of a project, body is multipart/form-data with image in field "file" and optional field "name"
+# body is streamed to disk by ImageUpload itself, so it is not declared as form parameters
+@router.post(
+    "/projects/{project_id}/images",
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["file"],
+        "properties": {"file": {"type": "string", "format": "binary"}, "name": {"type": "string"}},
+    }}}}}
+)
+async def upload_project_image(request: Request, project_id: int, cover: bool = False):
+    # project is checked on primary in its own short transaction, no connection is held while image is received
+    async with session_scope() as session:
+        if not await ProjectDBM.find_one_or_none_by_id(project_id, session=session):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Project with id:{project_id} was not found"
+            )
+
+    upload = ImageUpload(upload_settings.IMAGES_DIR, upload_settings.IMAGE_MAX_SIZE)
+    image_url, is_new_file = await upload.receive(request)
+
+    async with session_scope() as session:
+        # the same image uploaded to the same project again is not added twice
+        image = await ImageDBM.find_one_or_none(project_id=project_id, image_url=image_url, session=session)
+        is_new_image = image is None
+        if is_new_image:
+            image = await ImageDBM.add(
+                project_id=project_id,
+                name=upload.fields.get("name") or upload.filename,
+                image_url=image_url,
+                session=session
+            )
+        if cover:
+            # variants of new cover are generated in background
+            await ProjectDBM.update_by_id(
+                project_id, cover=image_url, cover_variants=None, cover_variants_claimed_at=None, session=session
+            )
+
+    return {
+        "id": image.id,
+        "image_url": image_url,
+        "deduplicated": not is_new_file,
+        "created": is_new_image,
+    }
+
+
+# claim the oldest unassigned applications for a worker, safe to call by many workers and server processes at once
+@router.post("/workers/{worker_id}/claim")
+async def claim_applications(worker_id: int, limit: int = Query(default=1, ge=1, le=100)):
+    # worker is checked and applications are claimed in one short transaction on primary
+    async with session_scope() as session:
+        worker = await UserDBM.find_one_or_none(
+            id=worker_id, user_type=WORKER_USER_TYPE, is_active=True, session=session
+        )
+        if not worker:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Active worker with id:{worker_id} was not found"
+            )
+        applications = await ApplicationDBM.claim_next(worker_id, limit=limit, session=session)
+
+    return {
+        "worker_id": worker_id,
+        "items": applications,
+    }
+
+
+# dashboard of a worker: assigned applications with client and catalog names, newest assignments first
+@router.get("/workers/{worker_id}/assignments")
+async def get_worker_assignments(
+        worker_id: int,
+        limit: int = Query(default=50, ge=1, le=500),
+        cursor: str | None = None
+):
+    # read on primary, so that just claimed applications are listed; two queries whatever the page size
+    async with session_scope() as session:
+        worker = await UserDBM.find_one_or_none(id=worker_id, user_type=WORKER_USER_TYPE, session=session)
+        if not worker:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Worker with id:{worker_id} was not found"
+            )
+        assignments, next_cursor = await AssignmentDBM.find_worker_page(
+            worker_id,
+            limit=limit,
+            cursor=await decode_cursor(cursor) if cursor else None,
+            session=session
+        )
+
+    return {
+        "worker": {"id": worker.id, "name": worker.name, "job": worker.job, "is_active": worker.is_active},
+        "items": assignments,
+        "next_cursor": await encode_cursor(next_cursor) if next_cursor else None,
+    }
@@ -1,17 +1,56 @@
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.web.router import router as web_router
+from app.admin.router import router as admin_router
+from app.web.cache import catalog_cache
+from app.web.ingest import application_queue
+from app.web.uploads import ImageFiles
+from app.web.derivatives import derivative_pipeline
+from app.tg.notifier import application_notifier
+from app.web.db_manager import warm_up_pool
+from app.database import all_engines
+from app.metrics import MetricsMiddleware, render_metrics
 # from app.tg.router import router as tg_router
 
 from contextlib import asynccontextmanager
+from pathlib import Path
 # from app.tg.bot import bot, dp, bot_settings
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from config import db_settings, ingest_settings, upload_settings
 
 # from aiogram.types import Update
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info(
+        "Database pool: size=%s, max_overflow=%s, timeout=%ss, recycle=%ss, pre_ping=%s, "
+        "statement_cache_size=%s, statement_timeout=%sms",
+        db_settings.DB_POOL_SIZE, db_settings.DB_MAX_OVERFLOW, db_settings.DB_POOL_TIMEOUT,
+        db_settings.DB_POOL_RECYCLE, db_settings.DB_POOL_PRE_PING, db_settings.DB_STATEMENT_CACHE_SIZE,
+        db_settings.DB_STATEMENT_TIMEOUT
+    )
+
+    # open and prime pool connections, so first requests after deploy do not pay for connecting and compiling
+    await warm_up_pool(db_settings.DB_POOL_WARMUP)
+    # load catalog lookup tables, so validation of applications does not hit database
+    await catalog_cache.load()
+    # start sending of Telegram notifications about new applications, if bot is configured
+    if application_notifier.is_configured:
+        await application_notifier.start()
+    # start generation of resized image variants in worker processes
+    if upload_settings.IMAGE_VARIANT_PROCESSES > 0:
+        await derivative_pipeline.start()
+    # start batched writing of applications, spooled applications of previous runs are written first
+    if ingest_settings.APPLY_QUEUE_ENABLED:
+        await application_queue.start()
+
     # Set webhook for telegram bot
     # webhook_url = bot_settings.get_webhook_url()
     # await bot.set_webhook(
@@ -20,22 +59,36 @@ from fastapi.staticfiles import StaticFiles
     #     drop_pending_updates=True
     # )
     # print(f"Webhook set to {webhook_url}")
-    # yield  # app working
+    yield  # app working
     # # Upon closing of application -> webhook remove, bot session close
     # await bot.delete_webhook()
     # print("Webhook removed")
     # await bot.session.close()
 
+    # write applications still queued before connections are closed
+    if application_queue.is_running:
+        await application_queue.stop()
+    if derivative_pipeline.is_running:
+        await derivative_pipeline.stop()
+    # send notifications still pending and close bot session
+    if application_notifier.is_running:
+        await application_notifier.stop()
 
+    # close all pooled connections of primary and replicas
+    for pool_engine in all_engines:
+        await pool_engine.dispose()
 
-# Creating fastAPI App
-# app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+
+# Creating fastAPI App
+app = FastAPI(lifespan=lifespan)
 
 # adding router for web API
 app.include_router(web_router, prefix="/api/v1/web", tags=["web API"])
 
+# adding router for admin API
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin API"])
+
 # # adding router for telegram bot API
 # app.include_router(tg_router, prefix="/api/v1/tg")
 
@@ -46,7 +99,18 @@ app.include_router(web_router, prefix="/api/v1/web", tags=["web API"])
 # app.mount("/api/v1/tg/fonts", StaticFiles(directory="app/templates/tg/fonts"), name="tg-fonts")
 
 # adding path to static files for website
-app.mount("/api/v1/web/images", StaticFiles(directory="app/web/images"), name="web-images")
+# uploaded images are named by content hash and served with immutable caching
+Path(upload_settings.IMAGES_DIR).mkdir(parents=True, exist_ok=True)
+app.mount("/api/v1/web/images", ImageFiles(directory=upload_settings.IMAGES_DIR), name="web-images")
+
+# per-route latency and database usage, exposed in Prometheus text format
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 
 origins = [
     "http://localhost",
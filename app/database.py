@@ -1,44 +1,136 @@
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from itertools import cycle
 
-from sqlalchemy import func
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy import func, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession, AsyncEngine
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session
 from config import db_settings
+from app.metrics import TimedQueuePool, instrument_engine
+from app.slow_queries import slow_query_log
 
 DATABASE_URL = db_settings.DB_URL
 
-engine = create_async_engine(url=DATABASE_URL)
+def create_engine(url: str) -> AsyncEngine:
+    # asyncpg specific connection settings, other drivers do not accept them
+    connect_args = {}
+    if make_url(url).get_driver_name() == "asyncpg":
+        connect_args = {
+            "prepared_statement_cache_size": db_settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {"statement_timeout": str(db_settings.DB_STATEMENT_TIMEOUT)},
+        }
+
+    new_engine = create_async_engine(
+        url=url,
+        pool_size=db_settings.DB_POOL_SIZE,
+        max_overflow=db_settings.DB_MAX_OVERFLOW,
+        pool_timeout=db_settings.DB_POOL_TIMEOUT,
+        pool_recycle=db_settings.DB_POOL_RECYCLE,
+        pool_pre_ping=db_settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+    )
+    # count and time queries for per-route metrics
+    instrument_engine(new_engine)
+    # record statements slower than configured threshold
+    slow_query_log.install(new_engine)
+    return new_engine
+
+
+# primary database -> all writes and reads which must see them
+engine = create_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# read replicas -> read-only queries, used in turns
+replica_engines = [create_engine(url) for url in db_settings.DB_REPLICA_URLS]
+replica_session_makers = [
+    async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    for replica_engine in replica_engines
+]
+replica_session_makers_cycle = cycle(replica_session_makers)
+all_engines = [engine, *replica_engines]
+
+# set once current request or task has written something, its later reads go to primary (read-your-writes)
+read_from_primary: ContextVar[bool] = ContextVar("read_from_primary", default=False)
+
+
+@contextmanager
+def primary_reads():
+    # reads inside the block go to primary even if nothing was written yet
+    token = read_from_primary.set(True)
+    try:
+        yield
+    finally:
+        read_from_primary.reset(token)
+
+
+def read_session_maker() -> async_sessionmaker[AsyncSession]:
+    if not replica_session_makers or read_from_primary.get():
+        return async_session_maker
+    return next(replica_session_makers_cycle)
+
+
 # base class for elements that has created_at and updated_at fields
 class Base(AsyncAttrs, DeclarativeBase):
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
 
 
-# generate asynchronous session to database -> easy to use instead of creating new session everytime
-# async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-#     async with async_session_maker() as session:
-#         yield session
-
-# class SessionContextManager:
-#
-#     def __init__(self) -> None:
-#         self.session_factory = async_session_maker
-#         self.session = None
-#
-#     async def __aenter__(self) -> None:
-#         self.session = self.session_factory()
-#
-#     async def __aexit__(self, *args: object) -> None:
-#         await self.rollback()
-#
-#     async def commit(self) -> None:
-#         await self.session.commit()
-#         await self.session.close()
-#         self.session = None
-#
-#     async def rollback(self) -> None:
-#         await self.session.rollback()
-#         await self.session.close()
-#         self.session = None
\ No newline at end of file
+# callbacks called with the model class after a transaction that wrote to that model is committed
+write_listeners: dict[type, list[Callable[[type], None]]] = {}
+
+
+def register_write_listener(model: type, callback: Callable[[type], None]) -> None:
+    write_listeners.setdefault(model, []).append(callback)
+
+
+def mark_written(session: AsyncSession, model: type) -> None:
+    # remember written model on the session, listeners are notified only once the data is committed
+    session.sync_session.info.setdefault("written_models", set()).add(model)
+    # replicas may not have the data yet, so following reads of the caller go to primary
+    read_from_primary.set(True)
+
+
+@event.listens_for(Session, "after_commit")
+def notify_write_listeners(session: Session) -> None:
+    for model in session.info.pop("written_models", set()):
+        for callback in write_listeners.get(model, []):
+            callback(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_written_models(session: Session) -> None:
+    session.info.pop("written_models", None)
+
+
+# generate asynchronous session to database -> one session and transaction shared by whole request
+# committed when request is handled successfully, rolled back on any error
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker() as session:
+        async with session.begin():
+            yield session
+
+
+# read-only variant for public read endpoints -> served by a replica if there are any
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session_maker()() as session:
+        async with session.begin():
+            yield session
+
+
+@asynccontextmanager
+async def session_scope(
+        session: AsyncSession | None = None,
+        read_only: bool = False
+) -> AsyncGenerator[AsyncSession, None]:
+    # reuse session of the request if given, otherwise open own short transaction committed on exit
+    # own read-only transactions are opened on a replica if there are any
+    if session is not None:
+        yield session
+        return
+    session_maker = read_session_maker() if read_only else async_session_maker
+    async with session_maker() as new_session:
+        async with new_session.begin():
+            yield new_session
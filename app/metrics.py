@@ -0,0 +1,199 @@
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# route label used for database work done outside of requests (startup, background tasks)
+NO_ROUTE = "none"
+
+
+def format_labels(names: tuple[str, ...], values: tuple) -> str:
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in Prometheus text format.
+    """
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple, value: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{{{format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative histogram with labels, rendered in Prometheus text format.
+    """
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [counts per bucket, sum, count]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.series.items():
+            label_str = format_labels(self.label_names, labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_str},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_str},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {total}")
+            lines.append(f"{self.name}_count{{{label_str}}} {count}")
+        return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"), LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request.", ("route",), QUERY_COUNT_BUCKETS
+)
+db_queries = Counter("db_queries_total", "Database queries executed.", ("route",))
+db_query_seconds = Counter("db_query_seconds_total", "Time spent executing database queries.", ("route",))
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waited for pool connections per HTTP request.", ("route",), LATENCY_BUCKETS
+)
+notifications = Counter(
+    "tg_notifications_total", "Application notifications by result (sent, failed, dropped).", ("result",)
+)
+
+all_metrics = [request_duration, request_queries, db_queries, db_query_seconds, pool_wait, notifications]
+
+
+class RequestStats:
+    """
+    Database work done while handling one request.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+
+
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+
+def route_of(scope: dict) -> str:
+    # router puts matched route into scope, template is used as label to keep number of series small
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def current_route() -> str:
+    stats = current_request_stats.get()
+    return route_of(stats.scope) if stats else NO_ROUTE
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool recording how long each checkout waited for a connection.
+    """
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = perf_counter() - start
+            stats = current_request_stats.get()
+            if stats:
+                stats.pool_wait += elapsed
+            else:
+                pool_wait.observe((NO_ROUTE,), elapsed)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = perf_counter() - conn.info["query_start"].pop()
+    # route is known only once request is routed, so request work is recorded by middleware at the end
+    stats = current_request_stats.get()
+    if stats:
+        stats.queries += 1
+        stats.db_time += elapsed
+    else:
+        db_queries.inc((NO_ROUTE,))
+        db_query_seconds.inc((NO_ROUTE,), elapsed)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    # count and time every statement sent to database
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and database usage of every HTTP request by route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request_stats.set(stats)
+        response_status = 500
+        start = perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_stats.reset(token)
+            route = route_of(scope)
+            request_duration.observe((scope["method"], route, response_status), perf_counter() - start)
+            request_queries.observe((route,), stats.queries)
+            db_queries.inc((route,), stats.queries)
+            db_query_seconds.inc((route,), stats.db_time)
+            pool_wait.observe((route,), stats.pool_wait)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in all_metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
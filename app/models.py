@@ -1,13 +1,25 @@
-from sqlalchemy import String, BigInteger, ForeignKey, Boolean, Float, UniqueConstraint
+from datetime import date, datetime
+
+from sqlalchemy import String, BigInteger, ForeignKey, Boolean, Float, Date, UniqueConstraint, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
+# text search configuration of project search, portfolio is written in russian
+SEARCH_CONFIG = "russian"
+
+# user type of staff working on applications
+WORKER_USER_TYPE = "worker"
+# status of application waiting in dispatch queue and of application claimed by a worker
+STATUS_NOT_ASSIGNED = "worker not assigned"
+STATUS_ASSIGNED = "worker assigned"
+
 
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
-    phone: Mapped[str] = mapped_column(String, nullable=False)
+    phone: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
     email: Mapped[str] = mapped_column(String, nullable=True)
     user_type: Mapped[str] = mapped_column(String, nullable=False, default="user")
     job: Mapped[str] = mapped_column(String, nullable=True)
@@ -21,51 +33,62 @@ class User(Base):
 
     # relationships
     applications: Mapped[list["Application"]] = relationship("Application", back_populates="user")
-    assigned_applications: Mapped[list["Application"]] = relationship("Assignment", back_populates="worker")
+    assigned_applications: Mapped[list["Assignment"]] = relationship("Assignment", back_populates="worker")
 
 
 class ServiceType(Base):
     __tablename__ = "service_types"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
 
 
 class ClientType(Base):
     __tablename__ = "client_types"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
 
 class BudgetType(Base):
     __tablename__ = "budget_types"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
 
 
 class DeadlineType(Base):
     __tablename__ = "deadline_types"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True, index=True)
 
 
 class Application(Base):
     __tablename__ = "applications"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), index=True)
     client_name: Mapped[str] = mapped_column(String, nullable=False)
     client_phone: Mapped[str] = mapped_column(String, nullable=False)
     client_email: Mapped[str] = mapped_column(String, nullable=False)
     client_comment: Mapped[str] = mapped_column(String, nullable=True)
-    status_label: Mapped[str] = mapped_column(String, nullable=False, default="worker not assigned")
+    status_label: Mapped[str] = mapped_column(String, nullable=False, default=STATUS_NOT_ASSIGNED)
     status_description: Mapped[str] = mapped_column(String, nullable=True)
     service_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("service_types.id"))
-    client_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("client_types.id"))
-    budget_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("budget_types.id"))
-    deadline_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("deadline_types.id"))
+    client_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("client_types.id"), index=True)
+    budget_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("budget_types.id"), index=True)
+    deadline_type_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("deadline_types.id"), index=True)
     approved_cost: Mapped[float] = mapped_column(Float, nullable=True)
 
+    # indexes for keyset paginated listing of applications, newest first
+    __table_args__ = (
+        Index("ix_applications_created_at_id", "created_at", "id"),
+        Index("ix_applications_status_label_created_at_id", "status_label", "created_at", "id"),
+        Index("ix_applications_service_type_id_created_at_id", "service_type_id", "created_at", "id"),
+    )
+
     #relationships
     user: Mapped["User"] = relationship("User", back_populates="applications")
-    workers: Mapped[list["User"]] = relationship("Assignment", back_populates="application")
+    workers: Mapped[list["Assignment"]] = relationship("Assignment", back_populates="application")
+    service_type: Mapped["ServiceType"] = relationship("ServiceType")
+    client_type: Mapped["ClientType"] = relationship("ClientType")
+    budget_type: Mapped["BudgetType"] = relationship("BudgetType")
+    deadline_type: Mapped["DeadlineType"] = relationship("DeadlineType")
 
 
 class Assignment(Base):
@@ -74,11 +97,26 @@ class Assignment(Base):
     worker_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"))
     job_description: Mapped[str] = mapped_column(String, nullable=True)
 
+    # index for keyset paginated listing of worker's assignments, newest first
+    __table_args__ = (
+        Index("ix_assignments_worker_id_created_at_application_id", "worker_id", "created_at", "application_id"),
+    )
+
     # relationships
     application: Mapped["Application"] = relationship("Application", back_populates="workers")
     worker: Mapped["User"] = relationship("User", back_populates="assigned_applications", foreign_keys=[worker_id])
 
 
+class ApplicationStat(Base):
+    __tablename__ = "application_stats"
+    # number of applications created on the day having the given value of a dimension, e.g. service type id or status;
+    # maintained by ApplicationDBM in the same transaction as the applications are written
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    dimension: Mapped[str] = mapped_column(String, primary_key=True)
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
 class Project(Base):
     __tablename__ = "projects"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
@@ -88,7 +126,26 @@ class Project(Base):
     task: Mapped[str] = mapped_column(String, nullable=True)
     done: Mapped[str] = mapped_column(String, nullable=True)
     price: Mapped[str] = mapped_column(String, nullable=True)
+    # resized variants of cover {format: {width: file name}}, filled in background; null -> not generated yet
+    cover_variants: Mapped[dict] = mapped_column(JSONB(none_as_null=True), nullable=True)
+    # set while cover variants are being generated, claim expires if the generating process dies
+    cover_variants_claimed_at: Mapped[datetime] = mapped_column(nullable=True)
     from_application_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("applications.id"), nullable=True)
+    # maintained by database from text fields, title matches rank above description, task and done
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(task, '') || ' ' || coalesce(done, '')), 'C')",
+            persisted=True
+        ),
+        nullable=True
+    )
+
+    __table_args__ = (
+        Index("ix_projects_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     # Relationships
     images: Mapped[list["Image"]] = relationship("Image", back_populates="project", uselist=True)
@@ -98,9 +155,13 @@ class Project(Base):
 class Image(Base):
     __tablename__ = "images"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    project_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("projects.id"))
+    project_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("projects.id"), index=True)
     name: Mapped[str] = mapped_column(String, nullable=True)
     image_url: Mapped[str] = mapped_column(String, nullable=True)
+    # resized variants of image {format: {width: file name}}, filled in background; null -> not generated yet
+    variants: Mapped[dict] = mapped_column(JSONB(none_as_null=True), nullable=True)
+    # set while variants are being generated, claim expires if the generating process dies
+    variants_claimed_at: Mapped[datetime] = mapped_column(nullable=True)
 
     # Relationships
     project: Mapped["Project"] = relationship("Project", back_populates="images")
@@ -109,7 +170,7 @@ class Image(Base):
 class Tag(Base):
     __tablename__ = "tags"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, nullable=True)
+    name: Mapped[str] = mapped_column(String, nullable=True, index=True)
 
     # Relationships
     projects: Mapped[list["Project"]] = relationship("ProjectTag", back_populates="tag")
@@ -122,8 +183,10 @@ class ProjectTag(Base):
     project_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("projects.id"))
     tag_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("tags.id"))
 
+    # (project_id, tag_id) -> tags of a project, (tag_id, project_id) -> projects with a tag without table access
     __table_args__ = (
         UniqueConstraint("project_id", "tag_id", name="project_tag_unique_id"),
+        Index("ix_project_tags_tag_id_project_id", "tag_id", "project_id"),
     )
 
     # Relationships
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import re
+import sys
+from collections import deque
+from datetime import datetime
+from time import perf_counter
+from uuid import uuid4
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import current_route
+from config import db_settings
+
+logger = logging.getLogger(__name__)
+
+# explain plans captured at the same time, further slow queries are recorded without plan
+MAX_PENDING_EXPLAINS = 2
+
+# re-running a locking read takes row locks on a side connection and makes SKIP LOCKED workers skip rows
+LOCKING_CLAUSE = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b", re.IGNORECASE)
+
+
+def redact_parameters(parameters) -> list[str] | dict[str, str]:
+    # only types of values are kept, values may contain personal data of clients
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def find_dbm_method() -> str | None:
+    """
+    Finds BaseDBM method which issued the statement currently executed.
+    Statements run in a greenlet spawned by the awaiting coroutine, so frames of the parent greenlet are searched.
+    Returns:
+        Name as "ClassDBM.method" or None if statement was not issued by database manager.
+    """
+    frames = [sys._getframe()]
+    parent = greenlet.getcurrent().parent
+    if parent is not None and parent.gr_frame is not None:
+        frames.append(parent.gr_frame)
+    for frame in frames:
+        while frame is not None:
+            owner = frame.f_locals.get("cls")
+            if isinstance(owner, type) and owner.__name__.endswith("DBM"):
+                return f"{owner.__name__}.{frame.f_code.co_name}"
+            frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    """
+    Records statements slower than threshold into a ring buffer, optionally with their generic EXPLAIN plan.
+    Plans are captured in background on a separate connection, inside a transaction which is always rolled back.
+    Generic plans show parameters as $1, $2..., so that values (personal data of clients) never get into the log,
+    the statement is planned only and not executed again.
+    """
+
+    def __init__(self, threshold_ms: int, explain: bool, size: int):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.entries: deque[dict] = deque(maxlen=size)
+        # sync engine of executed statement -> async engine plan is captured with
+        self.engines: dict = {}
+        self._explain_tasks: set[asyncio.Task] = set()
+
+    def install(self, engine: AsyncEngine) -> None:
+        if self.threshold_ms <= 0:
+            return
+        self.engines[engine.sync_engine] = engine
+        event.listen(engine.sync_engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self.after_cursor_execute)
+
+    @staticmethod
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("slow_query_start", []).append(perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        duration_ms = (perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+        # plans are not recorded themselves
+        if duration_ms < self.threshold_ms or conn.get_execution_options().get("slow_query_explain"):
+            return
+
+        entry = {
+            "time": datetime.now().isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "statement": statement,
+            "parameters": redact_parameters(parameters),
+            "dbm_method": find_dbm_method(),
+            "route": current_route(),
+            "plan": None,
+        }
+        self.entries.append(entry)
+        logger.warning(
+            "Slow query %.1fms [%s %s]: %s", duration_ms, entry["dbm_method"], entry["route"], " ".join(statement.split())
+        )
+
+        # only plain reads are explained
+        if (
+                self.explain
+                and not executemany
+                and statement.lstrip().upper().startswith("SELECT")
+                and not LOCKING_CLAUSE.search(statement)
+                and len(self._explain_tasks) < MAX_PENDING_EXPLAINS
+        ):
+            task = asyncio.get_running_loop().create_task(
+                self.capture_plan(self.engines[conn.engine], entry, statement, parameters)
+            )
+            self._explain_tasks.add(task)
+            task.add_done_callback(self._explain_tasks.discard)
+
+    async def capture_plan(self, engine: AsyncEngine, entry: dict, statement: str, parameters) -> None:
+        # plan is captured on the same database (primary or replica) the statement was executed on
+        # prepared statements outlive transactions, unique name never clashes with one left by failed deallocation
+        name = f"slow_query_plan_{uuid4().hex}"
+        try:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(slow_query_explain=True)
+                transaction = await conn.begin()
+                is_prepared = False
+                try:
+                    await conn.exec_driver_sql("SET LOCAL plan_cache_mode = force_generic_plan")
+                    await conn.exec_driver_sql(f"PREPARE {name} AS {statement}")
+                    is_prepared = True
+                    # values of generic plan do not matter, real ones are not sent at all
+                    arguments = f"({', '.join(['NULL'] * len(parameters))})" if parameters else ""
+                    result = await conn.exec_driver_sql(f"EXPLAIN EXECUTE {name}{arguments}")
+                    entry["plan"] = "\n".join(row[0] for row in result)
+                finally:
+                    await transaction.rollback()
+                    if is_prepared:
+                        await conn.exec_driver_sql(f"DEALLOCATE {name}")
+        except Exception as e:
+            entry["plan"] = f"plan was not captured: {e!r}"
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=db_settings.DB_SLOW_QUERY_MS,
+    explain=db_settings.DB_SLOW_QUERY_EXPLAIN,
+    size=db_settings.DB_SLOW_QUERY_LOG_SIZE
+)
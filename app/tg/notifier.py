@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import random
+from time import monotonic
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError, TelegramAPIError
+
+from app.metrics import notifications
+from config import bot_settings
+
+logger = logging.getLogger(__name__)
+
+# applications listed in one digest, the rest is only counted
+MAX_LISTED = 15
+# Telegram rejects longer messages, digest lists only applications fitting into it
+MESSAGE_LIMIT = 4096
+# room left for the line with number of applications not listed
+NOT_LISTED_RESERVE = 64
+# longest shown client fields, longer ones are cut
+MAX_FIELD_LENGTH = 100
+MAX_COMMENT_LENGTH = 300
+# seconds to wait before retries of failed sends, doubled with every attempt
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# seconds given to sending of pending notifications on shutdown
+STOP_TIMEOUT = 5.0
+
+
+def shorten(text: str, length: int) -> str:
+    return text if len(text) <= length else f"{text[:length - 1]}…"
+
+
+def format_application(event: dict) -> str:
+    fields = [shorten(str(event[field]), MAX_FIELD_LENGTH) for field in ("number", "name", "phone", "email")]
+    catalogs = [
+        shorten(str(event[field]), MAX_FIELD_LENGTH)
+        for field in ("service_type", "client_type", "budget_type", "deadline_type")
+    ]
+    lines = [
+        "Заявка {}: {}, {}, {}".format(*fields),
+        " / ".join(catalogs),
+    ]
+    if event.get("comment"):
+        lines.append(shorten(event["comment"], MAX_COMMENT_LENGTH))
+    return "\n".join(lines)
+
+
+def format_digest(events: list[dict], dropped: int) -> str:
+    if len(events) == 1 and not dropped:
+        return f"Новая заявка\n\n{format_application(events[0])}"
+    parts = [f"Новых заявок: {len(events) + dropped}"]
+    length = len(parts[0])
+    for event in events[:MAX_LISTED]:
+        part = format_application(event)
+        # applications which do not fit are counted only, so that whole digest is never rejected
+        if length + len(part) + 2 > MESSAGE_LIMIT - NOT_LISTED_RESERVE:
+            break
+        parts.append(part)
+        length += len(part) + 2
+    not_listed = len(events) - (len(parts) - 1) + dropped
+    if not_listed > 0:
+        parts.append(f"...и ещё {not_listed}")
+    return "\n\n".join(parts)
+
+
+class ApplicationNotifier:
+    """
+    Sends Telegram messages about new applications to admin chat from a background task, never from request handlers.
+    At most one message is sent per interval: first application after a quiet period is sent right away,
+    applications coming meanwhile are coalesced into one digest message.
+    Rate limit answers are honored (retry after), network and server errors are retried with exponential backoff.
+    """
+
+    def __init__(self, token: str | None, chat_id: str | None, api_url: str | None,
+                 interval: float, max_size: int, max_retries: int):
+        self.token = token
+        self.chat_id = chat_id
+        self.api_url = api_url
+        self.interval = interval
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.bot: Bot | None = None
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        # events taken from queue but not sent yet, kept here so that they survive cancellation on shutdown
+        self._pending: list[dict] = []
+        self._last_sent_at = float("-inf")
+        self._dropped = 0
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None
+
+    async def notify(self, event: dict) -> None:
+        """
+        Asynchronously queues notification about new application, never waits.
+        Notification is dropped when queue is full. It is a coroutine, so that background tasks run it
+        on the event loop and not in threadpool, asyncio.Queue is not thread-safe.
+        Arguments:
+            event: Application fields shown in message: number, name, phone, email, catalog names and comment.
+        """
+        if not self.is_running:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # dropped applications are still counted in the next digest
+            self._dropped += 1
+            notifications.inc(("dropped",))
+
+    async def start(self) -> None:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.api_url)) if self.api_url else None
+        self.bot = Bot(token=self.token, session=session)
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        # last digest is sent without waiting for interval, but shutdown is not held longer than timeout
+        self.take_pending()
+        if self._pending or self._dropped:
+            try:
+                await asyncio.wait_for(self.send(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error("%d application notifications were not sent before shutdown", len(self._pending))
+        await self.bot.session.close()
+
+    def take_pending(self) -> None:
+        while not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+
+    async def run(self) -> None:
+        while True:
+            self._pending.append(await self._queue.get())
+            # at most one message per interval, applications coming meanwhile join the digest
+            delay = self._last_sent_at + self.interval - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.take_pending()
+            await self.send()
+
+    async def send(self) -> None:
+        events = self._pending
+        text = format_digest(events, self._dropped)
+        for attempt in range(self.max_retries):
+            try:
+                await self.bot.send_message(chat_id=self.chat_id, text=text)
+                notifications.inc(("sent",), len(events))
+                break
+            except TelegramRetryAfter as e:
+                # flood control of Telegram tells exactly how long to wait
+                delay = e.retry_after
+            except (TelegramNetworkError, TelegramServerError):
+                delay = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.0)
+            except TelegramAPIError:
+                # bad request, blocked bot or wrong chat, retrying would not help
+                logger.exception("Notification about %d applications was rejected by Telegram", len(events))
+                notifications.inc(("failed",), len(events))
+                break
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(delay)
+        else:
+            logger.error("Notification about %d applications was not sent after %d attempts",
+                         len(events), self.max_retries)
+            notifications.inc(("failed",), len(events))
+        self._pending = []
+        self._dropped = 0
+        self._last_sent_at = monotonic()
+
+
+application_notifier = ApplicationNotifier(
+    token=bot_settings.BOT_TOKEN,
+    chat_id=bot_settings.ADMIN_ID,
+    api_url=bot_settings.API_URL,
+    interval=bot_settings.NOTIFY_INTERVAL,
+    max_size=bot_settings.NOTIFY_QUEUE_SIZE,
+    max_retries=bot_settings.NOTIFY_MAX_RETRIES
+)
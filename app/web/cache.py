@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from time import monotonic
+
+from sqlalchemy.future import select
+
+from app.database import async_session_maker, register_write_listener
+from app.models import ServiceType, ClientType, BudgetType, DeadlineType
+from config import cache_settings
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    """
+    In-memory name -> id lookup tables for the type catalogs used to validate applications.
+    Tables are loaded at startup, reloaded after TTL expires and invalidated upon writes to catalog models.
+    """
+    models = (ServiceType, ClientType, BudgetType, DeadlineType)
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._ids: dict[type, dict[str, int]] = {model: {} for model in self.models}
+        self._loaded_at: float | None = None
+        # bumped by every invalidation, so that load running meanwhile does not mark its stale result as fresh
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._refresh: asyncio.Task | None = None
+
+    @property
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or monotonic() - self._loaded_at > self.ttl
+
+    async def load(self, force: bool = True) -> None:
+        """
+        Asynchronously (re)loads all catalogs from database in one session.
+        Arguments:
+            force: Reload even if cache is still fresh.
+        """
+        async with self._lock:
+            # another coroutine could have reloaded cache while this one waited for the lock
+            if not force and not self.is_stale:
+                return
+            generation = self._generation
+            async with async_session_maker() as session:
+                ids = {}
+                for model in self.models:
+                    result = await session.execute(select(model.name, model.id))
+                    ids[model] = {name: data_id for name, data_id in result.all()}
+            self._ids = ids
+            if generation == self._generation:
+                self._loaded_at = monotonic()
+
+    async def get_id(self, model: type, name: str, wait: bool = True) -> int | None:
+        """
+        Asynchronously finds id of catalog item by its name, database is queried only when cache is stale.
+        Arguments:
+            model: Catalog model class.
+            name: Name of catalog item.
+            wait: Reload stale cache before lookup; if False, tables in memory are used and reloaded in background.
+        Returns:
+            Id of catalog item or None if nothing was found.
+        """
+        if self.is_stale:
+            if wait:
+                await self.load(force=False)
+            else:
+                self.refresh()
+        return self._ids[model].get(name)
+
+    def refresh(self) -> None:
+        # one background reload at a time, after failed reload the next lookup tries again
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self.load(force=False))
+            self._refresh.add_done_callback(self.log_refresh_error)
+
+    @staticmethod
+    def log_refresh_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Reload of catalog cache failed", exc_info=task.exception())
+
+    async def get_names(self, model: type) -> dict[int, str]:
+        """
+        Asynchronously builds id -> name lookup of catalog, database is queried only when cache is stale.
+        Arguments:
+            model: Catalog model class.
+        Returns:
+            Names of catalog items by their ids.
+        """
+        if self.is_stale:
+            await self.load(force=False)
+        return {data_id: name for name, data_id in self._ids[model].items()}
+
+    def invalidate(self, model: type | None = None) -> None:
+        # mark whole cache as stale, next lookup reloads all catalogs
+        self._generation += 1
+        self._loaded_at = None
+
+
+catalog_cache = CatalogCache(ttl=cache_settings.CATALOG_CACHE_TTL)
+
+for catalog_model in CatalogCache.models:
+    register_write_listener(catalog_model, catalog_cache.invalidate)
@@ -1,82 +1,244 @@
-from sqlalchemy.exc import SQLAlchemyError
+import asyncio
+from collections import Counter
+from collections.abc import AsyncGenerator
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (
+    insert, update, delete, tuple_, func, or_, text, String, BigInteger, Date, literal, literal_column, cast, exists,
+    union_all
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert, aggregate_order_by, ARRAY, REGCONFIG, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload, selectinload
-from app.database import async_session_maker
+from sqlalchemy.orm import contains_eager, joinedload, raiseload
+from app.database import all_engines, session_scope, mark_written
 
 from app.models import (
-    Project, Image, Tag, ProjectTag, User, Application,
-    ServiceType,  ClientType, BudgetType, DeadlineType, Image
+    Project, Image, Tag, ProjectTag, User, Application, Assignment, ApplicationStat,
+    ServiceType,  ClientType, BudgetType, DeadlineType, Image, SEARCH_CONFIG, STATUS_NOT_ASSIGNED, STATUS_ASSIGNED
 )
 
+# empty postgres array literals, used when project has no images or tags
+EMPTY_ARRAY = literal_column("'{}'")
+EMPTY_JSON_ARRAY = literal_column("'[]'::jsonb")
+
+# dimensions of application statistics -> application columns they are counted by
+STAT_DIMENSIONS = {
+    "service_type": "service_type_id",
+    "client_type": "client_type_id",
+    "budget_type": "budget_type_id",
+    "deadline_type": "deadline_type_id",
+    "status_label": "status_label",
+}
+
 
 class BaseDBM:
     model = None
 
     @classmethod
-    async def find_one_or_none_by_id(cls, data_id: int):
+    async def find_one_or_none_by_id(cls, data_id: int, session: AsyncSession | None = None):
         """
         Asynchronously finds and returns one sample of model by given criteria or None.
         Arguments:
             data_id: Filtering criteria as id.
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
         Returns:
             Model sample or None if nothing was found.
         """
-        async with async_session_maker() as session:
+        async with session_scope(session, read_only=True) as session:
             query = select(cls.model).filter_by(id=data_id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
     @classmethod
-    async def find_one_or_none(cls, **filter_by):
+    async def find_one_or_none(cls, session: AsyncSession | None = None, **filter_by):
         """
         Asynchronously finds and returns one sample of model by given criteria or None.
         Arguments:
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
             **filter_by: Filtering criteria as named parameters.
         Returns:
             Model sample or None if nothing was found.
         """
-        async with async_session_maker() as session:
+        async with session_scope(session, read_only=True) as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
     @classmethod
-    async def find_all(cls, **filter_by):
+    async def find_all(cls, session: AsyncSession | None = None, **filter_by):
         """
         Asynchronously finds and returns all samples of model by given criteria.
         Arguments:
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
             **filter_by: Filtering criteria as named parameters.
         Returns:
             List of model samples.
         """
-        async with async_session_maker() as session:
+        async with session_scope(session, read_only=True) as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalars().all()
 
     @classmethod
-    async def add(cls, **values):
+    async def add(cls, session: AsyncSession | None = None, **values):
         """
         Asynchronously creates new sample of model with given values.
+        With request-scoped session the sample is only flushed, commit is done by the owner of the session.
         Arguments:
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
             **values: Named parameters for creation of new model sample.
         Returns:
             Newly created model sample.
         """
-        async with async_session_maker() as session:
-            async with session.begin():
-                new_instance = cls.model(**values)
-                session.add(new_instance)
-                try:
-                    await session.commit()
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    raise e
-                return new_instance
+        async with session_scope(session) as session:
+            new_instance = cls.model(**values)
+            session.add(new_instance)
+            mark_written(session, cls.model)
+            # flush to get generated id of new sample
+            await session.flush()
+            return new_instance
+
+    @classmethod
+    async def update_by_id(cls, data_id: int, session: AsyncSession | None = None, **values) -> bool:
+        """
+        Asynchronously updates sample of model with given id by one UPDATE statement, without loading it.
+        Arguments:
+            data_id: Id of sample to update.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+            **values: Named parameters with new values.
+        Returns:
+            True if sample was found and updated.
+        """
+        async with session_scope(session) as session:
+            result = await session.execute(update(cls.model).where(cls.model.id == data_id).values(**values))
+            if result.rowcount:
+                mark_written(session, cls.model)
+            return bool(result.rowcount)
+
+    @classmethod
+    async def add_many(
+            cls,
+            values: list[dict],
+            ignore_conflicts: bool = False,
+            batch_size: int = 1000,
+            session: AsyncSession | None = None
+    ) -> list:
+        """
+        Asynchronously creates new samples of model with multi-row INSERT ... RETURNING, one statement per batch.
+        Arguments:
+            values: Dicts of values for new model samples, all with the same keys.
+            ignore_conflicts: Skip rows violating unique constraints (ON CONFLICT DO NOTHING), for idempotent loads.
+            batch_size: Maximum number of rows in one statement.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of newly created model samples, skipped rows are not included.
+        """
+        new_instances = []
+        async with session_scope(session) as session:
+            for start in range(0, len(values), batch_size):
+                query = pg_insert(cls.model) if ignore_conflicts else insert(cls.model)
+                query = query.values(values[start:start + batch_size])
+                if ignore_conflicts:
+                    query = query.on_conflict_do_nothing()
+                result = await session.scalars(query.returning(cls.model))
+                new_instances.extend(result.all())
+            if values:
+                mark_written(session, cls.model)
+        return new_instances
+
+    @classmethod
+    async def upsert_many(
+            cls,
+            values: list[dict],
+            index_elements: list[str],
+            batch_size: int = 1000,
+            session: AsyncSession | None = None
+    ) -> list:
+        """
+        Asynchronously inserts new or updates existing samples of model with multi-row INSERT ... ON CONFLICT DO UPDATE.
+        Arguments:
+            values: Dicts of values for model samples, all with the same keys.
+            index_elements: Columns of unique index identifying existing samples.
+            batch_size: Maximum number of rows in one statement.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of inserted and updated model samples.
+        """
+        instances = []
+        async with session_scope(session) as session:
+            for start in range(0, len(values), batch_size):
+                query = pg_insert(cls.model).values(values[start:start + batch_size])
+                query = query.on_conflict_do_update(
+                    index_elements=index_elements,
+                    set_={key: query.excluded[key] for key in values[0] if key not in index_elements}
+                )
+                result = await session.scalars(
+                    query.returning(cls.model),
+                    execution_options={"populate_existing": True}
+                )
+                instances.extend(result.all())
+            if values:
+                mark_written(session, cls.model)
+        return instances
 
 class ImageDBM(BaseDBM):
     model = Image
 
+    @classmethod
+    async def claim_without_variants(cls, limit: int, lease: float, session: AsyncSession | None = None) -> list:
+        """
+        Asynchronously claims images whose resized variants were not generated yet, in one short statement.
+        Claimed images are skipped by other processes until the claim expires, so that no transaction is held open
+        while images are resized and every image is processed by one process only.
+        Arguments:
+            limit: Maximum number of images.
+            lease: Seconds after which claim of a process which did not save the variants expires.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of (id, image_url) rows of claimed images.
+        """
+        async with session_scope(session) as session:
+            table = cls.model.__table__
+            picked = select(table.c.id).where(
+                table.c.variants.is_(None),
+                table.c.image_url.is_not(None),
+                or_(
+                    table.c.variants_claimed_at.is_(None),
+                    table.c.variants_claimed_at < func.now() - timedelta(seconds=lease)
+                )
+            ).order_by(table.c.id).limit(limit).with_for_update(skip_locked=True)
+            query = update(table).where(table.c.id.in_(picked)).values(
+                variants_claimed_at=func.now()
+            ).returning(table.c.id, table.c.image_url)
+            result = await session.execute(query)
+            return list(result.all())
+
+    @classmethod
+    async def save_variants(
+            cls,
+            image_id: int,
+            image_url: str,
+            variants: dict,
+            session: AsyncSession | None = None
+    ) -> bool:
+        """
+        Asynchronously saves variants of claimed image and releases the claim.
+        Write listeners are not notified, caller invalidates response caches once for many saved images.
+        Arguments:
+            image_id: Id of image.
+            image_url: File name the variants were generated from, nothing is saved if image was changed meanwhile.
+            variants: File names of variants as {format: {width: file name}}.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            True if variants were saved.
+        """
+        async with session_scope(session) as session:
+            result = await session.execute(update(cls.model).where(
+                cls.model.id == image_id, cls.model.image_url == image_url, cls.model.variants.is_(None)
+            ).values(variants=variants, variants_claimed_at=None))
+            return bool(result.rowcount)
+
 class TagDBM(BaseDBM):
     model = Tag
 
@@ -84,57 +246,165 @@ class ProjectDBM(BaseDBM):
     model = Project
 
     @classmethod
-    async def find_one_with_relations_or_none_by_id(cls, data_id: int):
+    async def claim_covers_without_variants(cls, limit: int, lease: float, session: AsyncSession | None = None) -> list:
+        """
+        Asynchronously claims projects whose cover variants were not generated yet, in one short statement.
+        Claimed projects are skipped by other processes until the claim expires, see ImageDBM.claim_without_variants().
+        Arguments:
+            limit: Maximum number of projects.
+            lease: Seconds after which claim of a process which did not save the variants expires.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of (id, cover) rows of claimed projects.
+        """
+        async with session_scope(session) as session:
+            table = cls.model.__table__
+            picked = select(table.c.id).where(
+                table.c.cover_variants.is_(None),
+                table.c.cover.is_not(None),
+                or_(
+                    table.c.cover_variants_claimed_at.is_(None),
+                    table.c.cover_variants_claimed_at < func.now() - timedelta(seconds=lease)
+                )
+            ).order_by(table.c.id).limit(limit).with_for_update(skip_locked=True)
+            query = update(table).where(table.c.id.in_(picked)).values(
+                cover_variants_claimed_at=func.now()
+            ).returning(table.c.id, table.c.cover)
+            result = await session.execute(query)
+            return list(result.all())
+
+    @classmethod
+    async def save_cover_variants(
+            cls,
+            project_id: int,
+            cover: str,
+            variants: dict,
+            session: AsyncSession | None = None
+    ) -> bool:
+        """
+        Asynchronously saves cover variants of claimed project and releases the claim.
+        Write listeners are not notified, caller invalidates response caches once for many saved covers.
+        Arguments:
+            project_id: Id of project.
+            cover: File name the variants were generated from, nothing is saved if cover was changed meanwhile.
+            variants: File names of variants as {format: {width: file name}}.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            True if variants were saved.
+        """
+        async with session_scope(session) as session:
+            result = await session.execute(update(cls.model).where(
+                cls.model.id == project_id, cls.model.cover == cover, cls.model.cover_variants.is_(None)
+            ).values(cover_variants=variants, cover_variants_claimed_at=None))
+            return bool(result.rowcount)
+
+    @classmethod
+    def projects_query(cls):
         """
-        Asynchronously finds and returns one sample of model with it's all relations loaded by given criteria or None.
+        Builds query of projects with image urls and tag names aggregated to arrays by database.
+        Images and tags are aggregated in correlated subqueries, so they do not multiply each other's rows.
+        Returns:
+            Select query with columns of the projects response.
+        """
+        tags = select(
+            func.array_agg(aggregate_order_by(Tag.name, ProjectTag.id))
+        ).select_from(ProjectTag).join(
+            Tag, Tag.id == ProjectTag.tag_id
+        ).where(ProjectTag.project_id == cls.model.id).scalar_subquery()
+
+        images = select(
+            func.array_agg(aggregate_order_by(Image.image_url, Image.id))
+        ).where(Image.project_id == cls.model.id).scalar_subquery()
+
+        # resized variants in the same order as imgs, null for images not processed yet
+        image_variants = select(
+            func.jsonb_agg(aggregate_order_by(Image.variants, Image.id))
+        ).where(Image.project_id == cls.model.id).scalar_subquery()
+
+        return select(
+            cls.model.id,
+            cls.model.title,
+            cls.model.description,
+            func.coalesce(tags, EMPTY_ARRAY, type_=ARRAY(String)).label("tags"),
+            cls.model.cover,
+            func.coalesce(images, EMPTY_ARRAY, type_=ARRAY(String)).label("imgs"),
+            cls.model.cover_variants,
+            func.coalesce(image_variants, EMPTY_JSON_ARRAY, type_=JSONB).label("img_variants"),
+            cls.model.task,
+            cls.model.done,
+            cls.model.price
+        )
+
+    @classmethod
+    async def find_one_with_relations_or_none_by_id(cls, data_id: int, session: AsyncSession | None = None):
+        """
+        Asynchronously finds and returns one project with its images and tag names by given criteria or None.
         Arguments:
             data_id: Filtering criteria as id.
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
         Returns:
-            Model sample or None if nothing was found.
+            Project as dict or None if nothing was found.
         """
-        async with async_session_maker() as session:
-            query = select(cls.model).filter_by(id=data_id).options(
-                joinedload(cls.model.images),
-                joinedload(cls.model.tags)
-            )
+        async with session_scope(session, read_only=True) as session:
+            query = cls.projects_query().where(cls.model.id == data_id)
             result = await session.execute(query)
-            return result.unique().scalar_one_or_none()
+            project = result.mappings().one_or_none()
+            return dict(project) if project else None
 
     @classmethod
-    async def find_all_projects_with_relations(cls, **filter_by):
+    async def find_all_projects_with_relations(cls, session: AsyncSession | None = None, **filter_by):
         """
-        Asynchronously finds and returns all samples of model by given criteria.
+        Asynchronously finds and returns all projects with their images and tag names by given criteria in one query.
         Arguments:
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
             **filter_by: Filtering criteria as named parameters.
         Returns:
-            List of model samples.
+            List of projects as dicts.
         """
-        async with async_session_maker() as session:
-            query = select(cls.model).filter_by(**filter_by).options(
-                selectinload(cls.model.images),
-                selectinload(cls.model.tags).selectinload(ProjectTag.tag)
-            )
+        async with session_scope(session, read_only=True) as session:
+            query = cls.projects_query().filter_by(**filter_by).order_by(cls.model.id)
             result = await session.execute(query)
-            result_data = result.scalars().all()
-            projects_dicts = []
-            for item in result_data:
-                tag_names = [tag.tag.name for tag in item.tags]
-
-                projects_dicts.append(
-                    {
-                        "id": item.id,
-                        "title": item.title,
-                        "description": item.description,
-                        "tags": tag_names,
-                        "cover": item.cover,
-                        "imgs": [image.image_url for image in item.images],
-                        "task": item.task,
-                        "done": item.done,
-                        "price": item.price
-                    }
-                )
+            return [dict(row) for row in result.mappings()]
 
-            return projects_dicts
+    @classmethod
+    async def search(
+            cls,
+            tags: list[str] | None = None,
+            text: str | None = None,
+            limit: int | None = None,
+            offset: int = 0,
+            session: AsyncSession | None = None
+    ) -> list[dict]:
+        """
+        Asynchronously finds page of projects with their images and tag names filtered by database.
+        Tags are matched through (tag_id, project_id) index, text through GIN index of search vector,
+        so cost depends on number of matching projects, not on size of portfolio.
+        Arguments:
+            tags: Tag names, only projects having all of them are found.
+            text: Web search style query over title, description, task and done; best matches go first.
+            limit: Maximum number of projects, all matching projects if not given.
+            offset: Number of matching projects to skip.
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
+        Returns:
+            List of projects as dicts.
+        """
+        async with session_scope(session, read_only=True) as session:
+            query = cls.projects_query()
+            if tags:
+                tagged = select(ProjectTag.project_id).join(
+                    Tag, Tag.id == ProjectTag.tag_id
+                ).where(Tag.name.in_(tags)).group_by(
+                    ProjectTag.project_id
+                ).having(func.count(Tag.name.distinct()) == len(set(tags)))
+                query = query.where(cls.model.id.in_(tagged))
+            if text:
+                ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), text)
+                query = query.where(cls.model.search_vector.bool_op("@@")(ts_query)).order_by(
+                    func.ts_rank(cls.model.search_vector, ts_query).desc()
+                )
+            query = query.order_by(cls.model.id).offset(offset or None).limit(limit)
+            result = await session.execute(query)
+            return [dict(row) for row in result.mappings()]
 
 
 class UserDBM(BaseDBM):
@@ -143,6 +413,612 @@ class UserDBM(BaseDBM):
 class ApplicationDBM(BaseDBM):
     model = Application
 
+    @classmethod
+    async def add(cls, session: AsyncSession | None = None, **values):
+        """
+        Asynchronously creates new application with given values and counts it in statistics in the same transaction.
+        Arguments:
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+            **values: Named parameters for creation of new application.
+        Returns:
+            Newly created application.
+        """
+        async with session_scope(session) as session:
+            new_instance = await super().add(session=session, **values)
+            await session.execute(ApplicationStatDBM.change_counts(ApplicationStatDBM.count([values])))
+            mark_written(session, ApplicationStat)
+            return new_instance
+
+    @classmethod
+    async def add_many(
+            cls,
+            values: list[dict],
+            ignore_conflicts: bool = False,
+            batch_size: int = 1000,
+            session: AsyncSession | None = None
+    ) -> list:
+        """
+        Asynchronously creates new applications with multi-row INSERT ... RETURNING, one statement per batch,
+        and counts them in statistics by one more statement in the same transaction.
+        Arguments:
+            values: Dicts of values for new applications, all with the same keys.
+            ignore_conflicts: Skip rows violating unique constraints (ON CONFLICT DO NOTHING), for idempotent loads.
+            batch_size: Maximum number of rows in one statement.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of newly created applications, skipped rows are not included.
+        """
+        async with session_scope(session) as session:
+            new_instances = await super().add_many(values, ignore_conflicts, batch_size, session=session)
+            # counted from returned rows, so skipped rows are not counted and created_at is the stored one
+            query = ApplicationStatDBM.change_counts(ApplicationStatDBM.count(
+                [cls.counted_values(instance) for instance in new_instances]
+            ))
+            if query is not None:
+                await session.execute(query)
+                mark_written(session, ApplicationStat)
+            return new_instances
+
+    @classmethod
+    async def upsert_many(
+            cls,
+            values: list[dict],
+            index_elements: list[str],
+            batch_size: int = 1000,
+            session: AsyncSession | None = None
+    ) -> list:
+        """
+        Asynchronously inserts new or updates existing applications and moves them between statistics counters
+        in the same transaction. Existing applications are locked first, so that their old values are subtracted
+        exactly once; then they are updated with INSERT ... ON CONFLICT DO UPDATE and the rest is inserted.
+        Application inserted concurrently with the same unique key fails the insert instead of being counted twice.
+        Arguments:
+            values: Dicts of values for applications, all with the same keys.
+            index_elements: Columns of unique index identifying existing applications.
+            batch_size: Maximum number of rows in one statement.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of updated and inserted applications.
+        """
+        key_columns = [getattr(cls.model, column) for column in index_elements]
+        counted_columns = [getattr(cls.model, column) for column in ("created_at", *STAT_DIMENSIONS.values())]
+        async with session_scope(session) as session:
+            old_values = []
+            for start in range(0, len(values), batch_size):
+                keys = [tuple(item[column] for column in index_elements) for item in values[start:start + batch_size]]
+                # locked in order of the key, so concurrent upserts of the same applications never deadlock
+                result = await session.execute(
+                    select(*key_columns, *counted_columns).where(tuple_(*key_columns).in_(keys)).order_by(
+                        *key_columns
+                    ).with_for_update()
+                )
+                old_values.extend(result.mappings().all())
+            existing_keys = {tuple(row[column] for column in index_elements) for row in old_values}
+
+            existing, new = [], []
+            for item in values:
+                is_existing = tuple(item[column] for column in index_elements) in existing_keys
+                (existing if is_existing else new).append(item)
+            # counters are changed once below, so inserts go around add_many() of applications
+            instances = await super().upsert_many(existing, index_elements, batch_size, session=session)
+            instances.extend(await super().add_many(new, batch_size=batch_size, session=session))
+
+            counts = ApplicationStatDBM.count([cls.counted_values(instance) for instance in instances])
+            counts.subtract(ApplicationStatDBM.count(old_values))
+            query = ApplicationStatDBM.change_counts(counts)
+            if query is not None:
+                await session.execute(query)
+                mark_written(session, ApplicationStat)
+            return instances
+
+    @staticmethod
+    def counted_values(application: Application) -> dict:
+        # values of stored application its statistics counters are keyed by
+        return {column: getattr(application, column) for column in ("created_at", *STAT_DIMENSIONS.values())}
+
+    @classmethod
+    async def update_by_id(cls, data_id: int, session: AsyncSession | None = None, **values) -> bool:
+        """
+        Asynchronously updates application with given id by one UPDATE statement, without loading it.
+        If status or catalog ids are changed, application is moved between statistics counters in the same transaction.
+        Arguments:
+            data_id: Id of application to update.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+            **values: Named parameters with new values.
+        Returns:
+            True if application was found and updated.
+        """
+        counted_columns = [column for column in STAT_DIMENSIONS.values() if column in values]
+        if not counted_columns:
+            return await super().update_by_id(data_id, session=session, **values)
+
+        async with session_scope(session) as session:
+            # current values are locked, so that concurrent change can not be counted twice
+            query = select(
+                cls.model.created_at, *(getattr(cls.model, column) for column in counted_columns)
+            ).where(cls.model.id == data_id).with_for_update()
+            old_values = (await session.execute(query)).mappings().one_or_none()
+            if old_values is None:
+                return False
+            await super().update_by_id(data_id, session=session, **values)
+
+            day = old_values["created_at"].date()
+            counts = Counter()
+            for dimension, column in STAT_DIMENSIONS.items():
+                if column in counted_columns and old_values[column] != values[column]:
+                    counts[(day, dimension, str(old_values[column]))] -= 1
+                    counts[(day, dimension, str(values[column]))] += 1
+            query = ApplicationStatDBM.change_counts(counts)
+            if query is not None:
+                await session.execute(query)
+                mark_written(session, ApplicationStat)
+            return True
+
+    @classmethod
+    async def add_with_user(cls, user_values: dict, session: AsyncSession | None = None, **values) -> int:
+        """
+        Asynchronously creates new application together with its user in one statement.
+        User is matched by unique phone: new user is inserted, existing one is kept as it is.
+        Statistics counters of the application are updated by second statement in the same transaction.
+        Arguments:
+            user_values: Named parameters for creation of new user, must include phone.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+            **values: Named parameters for creation of new application, except user_id.
+        Returns:
+            Id of newly created application.
+        """
+        async with session_scope(session) as session:
+            user_insert = pg_insert(User).values(**user_values)
+            # no-op update on conflict, so that id of already existing user is returned too
+            user_cte = user_insert.on_conflict_do_update(
+                index_elements=[User.phone],
+                set_={"phone": user_insert.excluded.phone}
+            ).returning(User.id).cte("upserted_user")
+
+            query = insert(cls.model).values(
+                user_id=select(user_cte.c.id).scalar_subquery(),
+                **values
+            ).add_cte(user_cte).returning(cls.model.id)
+            result = await session.execute(query)
+            await session.execute(ApplicationStatDBM.change_counts(ApplicationStatDBM.count([values])))
+            mark_written(session, User)
+            mark_written(session, cls.model)
+            mark_written(session, ApplicationStat)
+            return result.scalar_one()
+
+    @classmethod
+    async def add_many_with_users(
+            cls,
+            items: list[tuple[dict, dict]],
+            session: AsyncSession | None = None
+    ) -> list[int]:
+        """
+        Asynchronously creates batch of applications together with their users, two statements per batch.
+        Users are matched by unique phone: new users are inserted, existing ones are kept as they are.
+        Statistics counters of the applications are updated by one more statement in the same transaction.
+        Arguments:
+            items: Pairs of (user values, application values), user values must include phone.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            Ids of newly created applications in order of items.
+        """
+        if not items:
+            return []
+        async with session_scope(session) as session:
+            # one row per phone, the same row can not be upserted twice in one statement
+            users = {}
+            for user_values, _ in items:
+                users.setdefault(user_values["phone"], user_values)
+            user_insert = pg_insert(User).values(list(users.values()))
+            # no-op update on conflict, so that ids of already existing users are returned too
+            user_query = user_insert.on_conflict_do_update(
+                index_elements=[User.phone],
+                set_={"phone": user_insert.excluded.phone}
+            ).returning(User.phone, User.id)
+            user_ids = {phone: user_id for phone, user_id in (await session.execute(user_query)).all()}
+
+            query = insert(cls.model).values([
+                {"user_id": user_ids[user_values["phone"]], **values}
+                for user_values, values in items
+            ]).returning(cls.model.id)
+            result = await session.scalars(query)
+            await session.execute(ApplicationStatDBM.change_counts(
+                ApplicationStatDBM.count([values for _, values in items])
+            ))
+            mark_written(session, User)
+            mark_written(session, cls.model)
+            mark_written(session, ApplicationStat)
+            return list(result.all())
+
+    @classmethod
+    async def claim_next(cls, worker_id: int, limit: int = 1, session: AsyncSession | None = None) -> list[dict]:
+        """
+        Asynchronously assigns the oldest unassigned applications to worker in one statement.
+        Applications are picked with FOR UPDATE SKIP LOCKED, so concurrent claims of other workers and server processes
+        never wait for each other and never get the same application; assignments are created and status is changed
+        in the same statement together with statistics counters, so claim is either done completely or not at all.
+        Arguments:
+            worker_id: Id of worker user the applications are assigned to.
+            limit: Maximum number of applications to claim.
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            List of claimed applications as dicts, oldest first; empty if there is nothing to claim.
+        """
+        async with session_scope(session) as session:
+            # served by (status_label, created_at, id) index, rows being claimed by others are skipped, not waited for
+            picked = select(cls.model.id).where(
+                cls.model.status_label == STATUS_NOT_ASSIGNED,
+                ~exists().where(Assignment.application_id == cls.model.id)
+            ).order_by(
+                cls.model.created_at, cls.model.id
+            ).limit(limit).with_for_update(skip_locked=True).cte("picked")
+
+            # primary key of assignments guards against double assignment even if status was changed by hand
+            assigned = pg_insert(Assignment).from_select(
+                ["application_id", "worker_id"],
+                select(picked.c.id, literal(worker_id, BigInteger))
+            ).on_conflict_do_nothing().returning(Assignment.application_id).cte("assigned")
+
+            # updated through table, so that rows are returned as plain columns, not as ORM objects
+            table = cls.model.__table__
+            claimed = update(table).where(
+                table.c.id == assigned.c.application_id
+            ).values(status_label=STATUS_ASSIGNED).returning(*table.columns).cte("claimed")
+
+            # claimed applications move from one status to the other on the day they were created
+            day = cast(claimed.c.created_at, Date).label("day")
+            status_counts = union_all(*(
+                select(
+                    day,
+                    literal("status_label").label("dimension"),
+                    literal(key).label("key"),
+                    literal(count, BigInteger).label("count")
+                )
+                for key, count in ((STATUS_NOT_ASSIGNED, -1), (STATUS_ASSIGNED, 1))
+            )).subquery()
+
+            query = select(claimed).add_cte(
+                picked, assigned, claimed, ApplicationStatDBM.add_counts(status_counts).cte("counted")
+            ).order_by(claimed.c.created_at, claimed.c.id)
+            result = await session.execute(query)
+            rows = [dict(row) for row in result.mappings()]
+            if rows:
+                mark_written(session, Assignment)
+                mark_written(session, cls.model)
+                mark_written(session, ApplicationStat)
+            return rows
+
+    @classmethod
+    def apply_filters(cls, query, **filters):
+        """
+        Adds listing filters to query of applications, filters with None value are skipped.
+        Arguments:
+            query: Select query over applications.
+            **filters: Optional status_label, service_type_id, date_from and date_to (inclusive) filters.
+        Returns:
+            Filtered query.
+        """
+        if filters.get("status_label") is not None:
+            query = query.where(cls.model.status_label == filters["status_label"])
+        if filters.get("service_type_id") is not None:
+            query = query.where(cls.model.service_type_id == filters["service_type_id"])
+        if filters.get("date_from") is not None:
+            query = query.where(cls.model.created_at >= filters["date_from"])
+        if filters.get("date_to") is not None:
+            query = query.where(cls.model.created_at < filters["date_to"] + timedelta(days=1))
+        return query
+
+    @classmethod
+    async def stream_export(cls, batch_size: int = 1000, **filters) -> AsyncGenerator[list[dict], None]:
+        """
+        Asynchronously streams applications with catalog names resolved, oldest first.
+        Rows are fetched through server-side cursor in batches, so memory usage does not depend on number of rows.
+        Own session on primary is used, because stream outlives request-scoped session.
+        Arguments:
+            batch_size: Number of rows fetched from database at once.
+            **filters: Optional status_label, service_type_id, date_from and date_to (inclusive) filters.
+        Yields:
+            Lists of applications as dicts.
+        """
+        query = select(
+            cls.model.id,
+            cls.model.created_at,
+            cls.model.status_label,
+            cls.model.client_name,
+            cls.model.client_phone,
+            cls.model.client_email,
+            cls.model.client_comment,
+            ServiceType.name.label("service_type"),
+            ClientType.name.label("client_type"),
+            BudgetType.name.label("budget_type"),
+            DeadlineType.name.label("deadline_type"),
+            cls.model.approved_cost,
+        ).join(
+            ServiceType, ServiceType.id == cls.model.service_type_id
+        ).join(
+            ClientType, ClientType.id == cls.model.client_type_id
+        ).join(
+            BudgetType, BudgetType.id == cls.model.budget_type_id
+        ).join(
+            DeadlineType, DeadlineType.id == cls.model.deadline_type_id
+        ).order_by(cls.model.id)
+        query = cls.apply_filters(query, **filters).execution_options(yield_per=batch_size)
+
+        # long running query is kept on primary, on a hot standby replica it could be cancelled by recovery conflicts
+        async with session_scope() as session:
+            result = await session.stream(query)
+            async for rows in result.mappings().partitions():
+                yield [dict(row) for row in rows]
+
+    @classmethod
+    async def find_page(
+            cls,
+            limit: int,
+            cursor: tuple[datetime, int] | None = None,
+            session: AsyncSession | None = None,
+            **filters
+    ) -> tuple[list[dict], tuple[datetime, int] | None]:
+        """
+        Asynchronously finds one page of applications, newest first, using keyset pagination on (created_at, id).
+        Arguments:
+            limit: Maximum number of applications on the page.
+            cursor: (created_at, id) of the last application of previous page, first page if not given.
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
+            **filters: Optional status_label, service_type_id, date_from and date_to (inclusive) filters.
+        Returns:
+            List of applications as dicts and cursor of the next page or None if it is the last page.
+        """
+        async with session_scope(session, read_only=True) as session:
+            query = cls.apply_filters(select(*cls.model.__table__.columns), **filters)
+            if cursor is not None:
+                query = query.where(tuple_(cls.model.created_at, cls.model.id) < cursor)
+
+            # one extra row shows whether there is a next page
+            query = query.order_by(cls.model.created_at.desc(), cls.model.id.desc()).limit(limit + 1)
+            result = await session.execute(query)
+            rows = [dict(row) for row in result.mappings()]
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = (rows[-1]["created_at"], rows[-1]["id"])
+            return rows, next_cursor
+
+class ApplicationStatDBM(BaseDBM):
+    model = ApplicationStat
+
+    @classmethod
+    def upsert_counts(cls, query):
+        # existing counters are incremented, missing ones are created with the added count
+        return query.on_conflict_do_update(
+            index_elements=[cls.model.day, cls.model.dimension, cls.model.key],
+            set_={"count": cls.model.count + query.excluded.count, "updated_at": func.now()}
+        )
+
+    @classmethod
+    def add_counts(cls, counts):
+        """
+        Builds statement adding counts to statistics counters, missing counters are created.
+        Counters are upserted sorted by key, so concurrent transactions lock them in the same order and never deadlock.
+        Arguments:
+            counts: Selectable with (day, dimension, key, count) columns, the same counter may repeat.
+        Returns:
+            INSERT ... ON CONFLICT DO UPDATE statement, may be used as CTE of statement changing the applications.
+        """
+        day, dimension, key, count = counts.c
+        rows = select(day, dimension, key, func.sum(count)).group_by(day, dimension, key).order_by(day, dimension, key)
+        return cls.upsert_counts(pg_insert(cls.model).from_select(["day", "dimension", "key", "count"], rows))
+
+    @staticmethod
+    def count(applications: list[dict], sign: int = 1) -> Counter:
+        """
+        Counts applications by day of creation and every dimension.
+        Arguments:
+            applications: Values of applications, missing status means the default one,
+                missing created_at means the application is created by current transaction.
+            sign: 1 to add applications to counters, -1 to subtract them.
+        Returns:
+            Counts by (day, dimension, key), day is None for applications created by current transaction.
+        """
+        counts = Counter()
+        for values in applications:
+            created_at = values.get("created_at")
+            day = created_at.date() if created_at is not None else None
+            for dimension, column in STAT_DIMENSIONS.items():
+                value = values.get(column, STATUS_NOT_ASSIGNED if column == "status_label" else None)
+                counts[(day, dimension, str(value))] += sign
+        return counts
+
+    @classmethod
+    def change_counts(cls, counts: Counter):
+        """
+        Builds statement adding counts to statistics counters, missing counters are created.
+        Arguments:
+            counts: Counts to add (negative to subtract) by (day, dimension, key), e.g. from count();
+                day None means current date of the transaction,
+                it is the day of created_at of applications inserted in it.
+        Returns:
+            INSERT ... ON CONFLICT DO UPDATE statement to be executed in transaction writing the applications,
+            None if there is nothing to change.
+        """
+        # rows are sorted for the same reason as in add_counts(), current date is sorted as today
+        rows = sorted(
+            ((day, dimension, key, count) for (day, dimension, key), count in counts.items() if count),
+            key=lambda row: (row[0] or date.today(), row[1], row[2])
+        )
+        if not rows:
+            return None
+        return cls.upsert_counts(pg_insert(cls.model).values([
+            {
+                "day": day if day is not None else func.current_date(),
+                "dimension": dimension,
+                "key": key,
+                "count": count
+            }
+            for day, dimension, key, count in rows
+        ]))
+
+    @classmethod
+    async def rebuild(cls, session: AsyncSession | None = None) -> int:
+        """
+        Asynchronously recounts all statistics counters from applications, e.g. after applications were written
+        by instances not maintaining the counters. Writers of applications wait until the transaction is finished:
+        counters are locked before applications are read, so every application is counted exactly once, either here
+        or by its own transaction after the lock is released.
+        Arguments:
+            session: Request-scoped session to reuse, new session is opened and committed if not given.
+        Returns:
+            Number of counted applications.
+        """
+        async with session_scope(session) as session:
+            # reads of counters go on, changes of counters wait
+            await session.execute(text(f"LOCK TABLE {cls.model.__tablename__} IN EXCLUSIVE MODE"))
+            await session.execute(delete(cls.model))
+            applications = Application.__table__
+            day = cast(applications.c.created_at, Date).label("day")
+            counts = union_all(*(
+                select(
+                    day,
+                    literal(dimension).label("dimension"),
+                    cast(applications.c[column], String).label("key"),
+                    func.count().label("count")
+                ).group_by(day, applications.c[column])
+                for dimension, column in STAT_DIMENSIONS.items()
+            )).subquery()
+            await session.execute(cls.add_counts(counts))
+            mark_written(session, cls.model)
+            return await session.scalar(
+                select(func.coalesce(func.sum(cls.model.count), 0)).where(cls.model.dimension == "status_label")
+            )
+
+    @classmethod
+    async def summary(
+            cls,
+            date_from: date | None = None,
+            date_to: date | None = None,
+            session: AsyncSession | None = None
+    ) -> dict:
+        """
+        Asynchronously sums statistics counters of applications created in given period, two small queries
+        over counters whatever the number of applications.
+        Arguments:
+            date_from: First day of period (inclusive), since the first application if not given.
+            date_to: Last day of period (inclusive), up to today if not given.
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
+        Returns:
+            Total number of applications, counts by key of every dimension and daily counts.
+        """
+        async with session_scope(session, read_only=True) as session:
+            period = []
+            if date_from is not None:
+                period.append(cls.model.day >= date_from)
+            if date_to is not None:
+                period.append(cls.model.day <= date_to)
+
+            counts = {dimension: {} for dimension in STAT_DIMENSIONS}
+            result = await session.execute(
+                select(cls.model.dimension, cls.model.key, func.sum(cls.model.count)).where(*period).group_by(
+                    cls.model.dimension, cls.model.key
+                ).having(func.sum(cls.model.count) != 0)
+            )
+            for dimension, key, count in result.all():
+                counts.setdefault(dimension, {})[key] = int(count)
+
+            # every application has exactly one status, so counters of statuses add up to daily volume
+            result = await session.execute(
+                select(cls.model.day, func.sum(cls.model.count)).where(
+                    cls.model.dimension == "status_label", *period
+                ).group_by(cls.model.day).order_by(cls.model.day)
+            )
+            daily = [{"day": day, "count": int(count)} for day, count in result.all()]
+
+            return {
+                "total": sum(item["count"] for item in daily),
+                "counts": counts,
+                "daily": daily,
+            }
+
+
+class AssignmentDBM(BaseDBM):
+    model = Assignment
+
+    @classmethod
+    async def find_worker_page(
+            cls,
+            worker_id: int,
+            limit: int,
+            cursor: tuple[datetime, int] | None = None,
+            session: AsyncSession | None = None
+    ) -> tuple[list[dict], tuple[datetime, int] | None]:
+        """
+        Asynchronously finds one page of worker's assignments with their applications, clients and catalog names,
+        newest first, using keyset pagination on (created_at, application_id).
+        Everything is loaded by one query with joins, relationships not loaded by it raise instead of querying lazily.
+        Arguments:
+            worker_id: Id of worker user.
+            limit: Maximum number of assignments on the page.
+            cursor: (created_at, application_id) of the last assignment of previous page, first page if not given.
+            session: Request-scoped session to reuse, new read-only session is opened if not given.
+        Returns:
+            List of assignments as dicts and cursor of the next page or None if it is the last page.
+        """
+        async with session_scope(session, read_only=True) as session:
+            query = select(cls.model).join(cls.model.application).where(
+                cls.model.worker_id == worker_id
+            ).options(
+                contains_eager(cls.model.application).options(
+                    joinedload(Application.user),
+                    joinedload(Application.service_type),
+                    joinedload(Application.client_type),
+                    joinedload(Application.budget_type),
+                    joinedload(Application.deadline_type),
+                    raiseload("*")
+                ),
+                raiseload("*")
+            )
+            if cursor is not None:
+                query = query.where(tuple_(cls.model.created_at, cls.model.application_id) < cursor)
+
+            # one extra row shows whether there is a next page
+            query = query.order_by(cls.model.created_at.desc(), cls.model.application_id.desc()).limit(limit + 1)
+            result = await session.execute(query)
+            assignments = list(result.scalars().all())
+
+            next_cursor = None
+            if len(assignments) > limit:
+                assignments = assignments[:limit]
+                next_cursor = (assignments[-1].created_at, assignments[-1].application_id)
+            return [cls.as_dict(assignment) for assignment in assignments], next_cursor
+
+    @staticmethod
+    def as_dict(assignment: Assignment) -> dict:
+        # built from eagerly loaded attributes only
+        application = assignment.application
+        return {
+            "application_id": assignment.application_id,
+            "assigned_at": assignment.created_at,
+            "job_description": assignment.job_description,
+            "application": {
+                "id": application.id,
+                "created_at": application.created_at,
+                "status_label": application.status_label,
+                "status_description": application.status_description,
+                "service_type": application.service_type.name,
+                "client_type": application.client_type.name,
+                "budget_type": application.budget_type.name,
+                "deadline_type": application.deadline_type.name,
+                "approved_cost": application.approved_cost,
+                "comment": application.client_comment,
+            },
+            "client": {
+                "id": application.user.id,
+                "name": application.client_name,
+                "phone": application.client_phone,
+                "email": application.client_email,
+                "telegram_username": application.user.telegram_username,
+            },
+        }
+
 class BudgetTypeDBM(BaseDBM):
     model = BudgetType
 
@@ -157,6 +1033,28 @@ class ServiceTypeDBM(BaseDBM):
 
 
 
+async def warm_up_pool(connections: int) -> None:
+    """
+    Asynchronously opens pool connections of primary and replicas at once and runs hot read queries on each of them,
+    so that statements are compiled and prepared before the first requests come.
+    Arguments:
+        connections: Number of connections to open, limited by pool size.
+    """
+    async def prime(pool_engine: AsyncEngine) -> None:
+        async with pool_engine.connect() as conn:
+            async with AsyncSession(bind=conn) as session:
+                await ProjectDBM.find_all_projects_with_relations(session=session)
+                await ProjectDBM.find_one_with_relations_or_none_by_id(0, session=session)
+                await ApplicationDBM.find_page(limit=1, session=session)
+
+    # connections are held concurrently, otherwise pool would reuse the same one
+    await asyncio.gather(*(
+        prime(pool_engine)
+        for pool_engine in all_engines
+        for _ in range(min(connections, pool_engine.pool.size()))
+    ))
+
+
 async def initial_db_type_values():
     service_types = [
         "дизайн печат. материалов",
@@ -201,14 +1099,12 @@ async def initial_db_type_values():
         "1 месяц"
     ]
 
-    for service_type in service_types:
-        await ServiceTypeDBM.add(**{"name": service_type})
-
-    for budget_type in budget_types:
-        await BudgetTypeDBM.add(**{"name": budget_type})
-
-    for client_type in client_types:
-        await ClientTypeDBM.add(**{"name": client_type})
-
-    for deadline_type in deadline_types:
-        await DeadlineTypeDBM.add(**{"name": deadline_type})
+    # one multi-row insert per catalog in one transaction, already existing names are skipped
+    async with session_scope() as session:
+        for dbm, names in (
+                (ServiceTypeDBM, service_types),
+                (BudgetTypeDBM, budget_types),
+                (ClientTypeDBM, client_types),
+                (DeadlineTypeDBM, deadline_types)
+        ):
+            await dbm.add_many([{"name": name} for name in names], ignore_conflicts=True, session=session)
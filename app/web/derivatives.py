@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.database import session_scope, register_write_listener
+from app.models import Image, Project
+from app.web.db_manager import ImageDBM, ProjectDBM
+from app.web.imaging import make_variants
+from app.web.response_cache import response_cache
+from config import upload_settings
+
+logger = logging.getLogger(__name__)
+
+# images and covers claimed and processed at once
+BATCH_SIZE = 8
+# seconds after which images claimed by a process which died or failed are claimed again
+CLAIM_LEASE = 600
+# seconds before pending images are looked up again after a failure, e.g. database being down
+RETRY_DELAY = 30
+# variants of recently processed files, cover is usually one of the project images
+RECENT_SIZE = 256
+
+
+class DerivativePipeline:
+    """
+    Generates resized WebP and JPEG variants of project images and covers in background.
+    Resizing runs in a process pool, so neither the event loop nor request handling ever waits for it.
+    Pending images are looked up at startup and after every write to images or projects.
+    Rows are claimed in one short transaction and results are saved in another one, no transaction is open
+    while images are resized; claims are taken with SKIP LOCKED and last for a lease,
+    so several server processes share the work without doing it twice.
+    Saved variants do not invalidate response cache batch by batch, it is invalidated once the backlog is drained.
+    """
+
+    def __init__(self, directory: str, widths: list[int], processes: int):
+        self.directory = directory
+        self.widths = widths
+        self.processes = processes
+        self._executor: ProcessPoolExecutor | None = None
+        self._worker: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._recent: OrderedDict[str, dict] = OrderedDict()
+        # rows whose variants were saved since response cache was last invalidated
+        self._saved = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None
+
+    def wake(self, model: type | None = None) -> None:
+        # write listener, called after commit of new or changed images and projects
+        if self.is_running:
+            self._wakeup.set()
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        # spawned workers do not inherit event loop, pools and sockets of the server process
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    async def start(self) -> None:
+        self._executor = self.create_executor()
+        # images added while server was down are looked up right away
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        # unfinished rows stay without variants and are processed after restart
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while await self.process_images() or await self.process_covers():
+                    pass
+            except Exception:
+                logger.exception("Generation of image variants failed, retrying in %d seconds", RETRY_DELAY)
+                self.publish()
+                await asyncio.sleep(RETRY_DELAY)
+                self._wakeup.set()
+            else:
+                self.publish()
+
+    def publish(self) -> None:
+        # cached responses of projects are rebuilt once with all variants saved so far
+        if self._saved:
+            response_cache.invalidate()
+            self._saved = 0
+
+    async def derive(self, name: str) -> dict:
+        if name in self._recent:
+            return self._recent[name]
+        loop = asyncio.get_running_loop()
+        try:
+            variants = await loop.run_in_executor(self._executor, make_variants, self.directory, name, self.widths)
+        except BrokenProcessPool:
+            # worker process died, e.g. killed for memory; pool is replaced and the batch is retried after claim expires
+            self._executor = self.create_executor()
+            raise
+        except Exception as e:
+            # missing or broken file, empty map is saved so that it is not retried forever
+            logger.warning("Variants of image %s were not generated: %r", name, e)
+            variants = {}
+        self._recent[name] = variants
+        if len(self._recent) > RECENT_SIZE:
+            self._recent.popitem(last=False)
+        return variants
+
+    async def process_images(self) -> int:
+        images = await ImageDBM.claim_without_variants(BATCH_SIZE, CLAIM_LEASE)
+        variants = [await self.derive(image_url) for _, image_url in images]
+        async with session_scope() as session:
+            for (image_id, image_url), image_variants in zip(images, variants):
+                self._saved += await ImageDBM.save_variants(image_id, image_url, image_variants, session=session)
+        return len(images)
+
+    async def process_covers(self) -> int:
+        projects = await ProjectDBM.claim_covers_without_variants(BATCH_SIZE, CLAIM_LEASE)
+        variants = [await self.derive(cover) for _, cover in projects]
+        async with session_scope() as session:
+            for (project_id, cover), cover_variants in zip(projects, variants):
+                self._saved += await ProjectDBM.save_cover_variants(project_id, cover, cover_variants, session=session)
+        return len(projects)
+
+
+derivative_pipeline = DerivativePipeline(
+    directory=upload_settings.IMAGES_DIR,
+    widths=upload_settings.IMAGE_VARIANT_WIDTHS,
+    processes=upload_settings.IMAGE_VARIANT_PROCESSES
+)
+
+for written_model in (Image, Project):
+    register_write_listener(written_model, derivative_pipeline.wake)
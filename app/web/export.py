@@ -0,0 +1,31 @@
+import csv
+import io
+import json
+from collections.abc import AsyncGenerator
+
+from app.web.db_manager import ApplicationDBM
+
+EXPORT_COLUMNS = [
+    "id", "created_at", "status_label", "client_name", "client_phone", "client_email", "client_comment",
+    "service_type", "client_type", "budget_type", "deadline_type", "approved_cost"
+]
+
+
+# newline delimited json -> one application per line, one chunk per fetched batch
+async def export_ndjson(**filters) -> AsyncGenerator[str, None]:
+    async for rows in ApplicationDBM.stream_export(**filters):
+        yield "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+
+
+# csv with header line, one chunk per fetched batch
+async def export_csv(**filters) -> AsyncGenerator[str, None]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    async for rows in ApplicationDBM.stream_export(**filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
@@ -0,0 +1,69 @@
+import hashlib
+import os
+from pathlib import Path
+
+from PIL import Image as PILImage, ImageOps
+
+# format -> (file extension, save options)
+VARIANT_FORMATS = {
+    "webp": ("webp", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# bytes of original read at once while hashing it
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(path: Path) -> str:
+    # the same hash as of uploaded images, so that variants of uploads are named after their original
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def flatten(image: PILImage.Image) -> PILImage.Image:
+    # jpeg has no transparency, transparent parts are put on white background
+    if image.mode == "RGB":
+        return image
+    background = PILImage.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+    return background
+
+
+def make_variants(directory: str, name: str, widths: list[int]) -> dict[str, dict[str, str]]:
+    """
+    Resizes image to given widths and saves every size as WebP and JPEG in the images directory.
+    Variants are named by content hash of the original, so that originals with the same file name
+    in different subdirectories or with different extensions never overwrite each other's variants.
+    Runs in a worker process, images are never upscaled: widths above the original one are skipped,
+    image narrower than all widths gets one variant of its own width.
+    Arguments:
+        directory: Directory of images.
+        name: Path of original image relative to the directory.
+        widths: Target widths in pixels.
+    Returns:
+        File names of variants as {format: {width: file name}}.
+    """
+    directory = Path(directory)
+    stem = content_hash(directory / name)
+    variants = {image_format: {} for image_format in VARIANT_FORMATS}
+    with PILImage.open(directory / name) as original:
+        # photos are often stored rotated with orientation in EXIF
+        image = ImageOps.exif_transpose(original)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        for width in sorted({width for width in widths if width < image.width} or {image.width}):
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), PILImage.Resampling.LANCZOS)
+            for image_format, (extension, options) in VARIANT_FORMATS.items():
+                variant = f"{stem}-{width}w.{extension}"
+                # written under temporary name and renamed, so that file is never served half written
+                temp_path = directory / f".{variant}.part"
+                (flatten(resized) if image_format == "jpeg" else resized).save(
+                    temp_path, format=image_format.upper(), **options
+                )
+                os.replace(temp_path, directory / variant)
+                variants[image_format][str(width)] = variant
+    return variants
@@ -0,0 +1,234 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from pathlib import Path
+from time import monotonic, time
+from typing import TextIO
+from uuid import uuid4
+
+from sqlalchemy.exc import IntegrityError, DataError
+
+from app.database import session_scope
+from app.web.db_manager import ApplicationDBM
+from config import ingest_settings
+
+logger = logging.getLogger(__name__)
+
+# seconds before spool files which could not be written are replayed again, e.g. while database is down
+REPLAY_RETRY_DELAY = 30
+# errors of spool files which would fail the same way again, such files are put aside instead of replayed
+MALFORMED_SPOOL_ERRORS = (ValueError, KeyError, TypeError, IntegrityError, DataError)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def is_current(file: TextIO, path: Path) -> bool:
+    # spool file could have been replayed and removed or put aside while waiting for its lock
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(file.fileno())
+    return (stat.st_dev, stat.st_ino) == (opened.st_dev, opened.st_ino)
+
+
+def append_to_spool(path: Path, data: str) -> None:
+    # spool files are shared by all workers of the server, every access holds exclusive flock of the file
+    while True:
+        with open(path, "a", encoding="utf-8") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            if not is_current(file, path):
+                continue
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+            return
+
+
+class ApplicationQueue:
+    """
+    Bounded in-memory queue of validated applications, written to database by one background worker.
+    Worker waits at most flush interval after the first queued application and writes up to batch size applications
+    in one transaction, so write throughput grows with batch size instead of with number of connections.
+    Applications which could not be written (database down, shutdown) are appended to spool files
+    and written on next startup.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, spool_dir: str):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = Path(spool_dir)
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._replayer: asyncio.Task | None = None
+        # spooling of this process waits for its replay here instead of blocking a worker thread on the file lock
+        self._spool_lock = asyncio.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None
+
+    def put(self, user_values: dict, values: dict) -> str:
+        """
+        Queues application for writing without waiting for database.
+        Arguments:
+            user_values: Named parameters for creation of new user, must include phone.
+            values: Named parameters for creation of new application, except user_id.
+        Returns:
+            Receipt identifying queued application in logs and spool files.
+        """
+        if not self.is_running:
+            raise QueueFull
+        receipt = uuid4().hex
+        try:
+            self._queue.put_nowait((receipt, user_values, values))
+        except asyncio.QueueFull:
+            raise QueueFull from None
+        return receipt
+
+    async def start(self) -> None:
+        # applications left over by previous runs are written before new ones are accepted if possible,
+        # but startup never fails because of them, files which could not be written are retried in background
+        if not await self.replay_spool():
+            self._replayer = asyncio.create_task(self.retry_replay())
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._replayer is not None:
+            self._replayer.cancel()
+            try:
+                await self._replayer
+            except asyncio.CancelledError:
+                pass
+            self._replayer = None
+        # worker writes everything queued before the stop mark and exits
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+        # applications queued by requests finished after the stop mark
+        rest = []
+        while not self._queue.empty():
+            rest.append(self._queue.get_nowait())
+        for start in range(0, len(rest), self.batch_size):
+            await self.flush(rest[start:start + self.batch_size])
+
+    async def run(self) -> None:
+        while True:
+            batch = []
+            item = await self._queue.get()
+            deadline = monotonic() + self.flush_interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                # take everything already queued at once, wait only while queue is empty
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+            await self.flush(batch)
+            if item is None:
+                return
+
+    async def flush(self, batch: list) -> None:
+        if not batch:
+            return
+        try:
+            await ApplicationDBM.add_many_with_users([(user_values, values) for _, user_values, values in batch])
+        except Exception:
+            logger.exception("Writing of %d queued applications failed, they are spooled", len(batch))
+            try:
+                await self.spool(batch)
+            except Exception:
+                logger.exception("Spooling failed, applications are lost: %s", [receipt for receipt, *_ in batch])
+
+    async def spool(self, batch: list) -> None:
+        # one file per process, workers of the same server do not write into one file
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spool_dir / f"applications-{os.getpid()}.ndjson"
+        data = "".join(
+            json.dumps({"receipt": receipt, "user": user_values, "application": values}, ensure_ascii=False) + "\n"
+            for receipt, user_values, values in batch
+        )
+        async with self._spool_lock:
+            await asyncio.to_thread(append_to_spool, path, data)
+
+    async def retry_replay(self) -> None:
+        while True:
+            await asyncio.sleep(REPLAY_RETRY_DELAY)
+            if await self.replay_spool():
+                return
+
+    async def replay_spool(self) -> bool:
+        """
+        Asynchronously writes applications spooled by all workers of this and previous runs, never raises.
+        Malformed files are renamed to *.failed and left for manual inspection,
+        files which could not be written for other reasons (database down) are kept and replayed later.
+        Returns:
+            True if no spool file is left to be replayed.
+        """
+        if not self.spool_dir.is_dir():
+            return True
+        is_done = True
+        async with self._spool_lock:
+            # *.replaying files are left over by crashed replays of older versions
+            paths = [*self.spool_dir.glob("applications-*.ndjson"), *self.spool_dir.glob("applications-*.replaying")]
+            for path in sorted(paths):
+                try:
+                    file = open(path, encoding="utf-8")
+                except FileNotFoundError:
+                    continue
+                with file:
+                    # file is claimed by its lock, so that every spooled application is written by one worker only
+                    # and nothing is appended to it meanwhile, the lock is released by crash as well
+                    try:
+                        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        is_done = False
+                        continue
+                    if not is_current(file, path):
+                        continue
+                    try:
+                        items = [json.loads(line) for line in (await asyncio.to_thread(file.read)).splitlines()
+                                 if line.strip()]
+                        # whole file in one transaction, so that it is either written completely or replayed later
+                        async with session_scope() as session:
+                            for start in range(0, len(items), self.batch_size):
+                                await ApplicationDBM.add_many_with_users([
+                                    (item["user"], item["application"])
+                                    for item in items[start:start + self.batch_size]
+                                ], session=session)
+                    except MALFORMED_SPOOL_ERRORS:
+                        failed = path.with_name(f"{path.stem}-{int(time())}-{uuid4().hex[:8]}.failed")
+                        path.rename(failed)
+                        logger.exception("Spooled applications from %s can not be written, file was moved to %s",
+                                         path.name, failed.name)
+                        continue
+                    except Exception:
+                        logger.exception("Spooled applications from %s were not written, retrying in %d seconds",
+                                         path.name, REPLAY_RETRY_DELAY)
+                        is_done = False
+                        continue
+                    # removed while still locked, writers waiting for the lock notice it and start a new file
+                    path.unlink()
+                logger.warning("%d spooled applications from %s were written", len(items), path.name)
+        return is_done
+
+application_queue = ApplicationQueue(
+    max_size=ingest_settings.APPLY_QUEUE_SIZE,
+    batch_size=ingest_settings.APPLY_BATCH_SIZE,
+    flush_interval=ingest_settings.APPLY_FLUSH_INTERVAL_MS / 1000,
+    spool_dir=ingest_settings.APPLY_SPOOL_DIR
+)
@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from time import monotonic
+
+from fastapi import Request, Response, status
+
+from app.database import register_write_listener
+from app.models import Project, Image, Tag, ProjectTag
+from config import cache_settings, db_settings
+
+# responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+
+class CachedResponse:
+    """
+    Already serialized JSON response with its gzip variant and strong ETag.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = gzip.compress(body) if len(body) >= GZIP_MIN_SIZE else None
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+        # each encoding is a different representation and needs its own strong ETag
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.created_at = monotonic()
+
+
+class ResponseCache:
+    """
+    Cache of serialized responses of read-only endpoints keyed by route and query.
+    Responses are cacheable by clients and shared proxies, private ones (of authorized endpoints) by clients only.
+    Cache is cleared after writes to models the responses are built from, and entries expire after TTL,
+    which bounds staleness when writes are done by other processes.
+    Right after a write nothing is cached for settle time, replicas could still serve data from before the write.
+    Response built from data read before a write committed meanwhile is not stored either.
+    """
+
+    def __init__(self, ttl: int, max_age: int, max_entries: int, settle_time: float = 0, private: bool = False):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.settle_time = settle_time
+        self.private = private
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._invalidated_at: float | None = None
+        # incremented by every invalidation, requests remember the value they started reading with
+        self._generation = 0
+
+    @staticmethod
+    def key(request: Request) -> str:
+        return f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+    def get(self, request: Request) -> CachedResponse | None:
+        """
+        Finds cached response for the request.
+        Arguments:
+            request: Incoming request.
+        Returns:
+            Cached response or None if there is none or it has expired.
+        """
+        request.state.response_cache_generation = self._generation
+        entry = self._entries.get(self.key(request))
+        if entry is None or monotonic() - entry.created_at > self.ttl:
+            return None
+        return entry
+
+    def put(self, request: Request, content) -> CachedResponse:
+        """
+        Serializes content the same way JSONResponse does and stores it for the request.
+        Arguments:
+            request: Incoming request.
+            content: JSON serializable response content.
+        Returns:
+            Newly cached response, it is not stored while cache is settling after a write
+            or if cache was invalidated since get() of the same request.
+        """
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        entry = CachedResponse(body)
+        if self._invalidated_at is not None and monotonic() - self._invalidated_at < self.settle_time:
+            return entry
+        if getattr(request.state, "response_cache_generation", None) != self._generation:
+            return entry
+        key = self.key(request)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        # drop the oldest entries, so arbitrary query strings can not grow cache without bound
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        """
+        Builds response from cached entry: 304 if client has it already, gzip body if client accepts it.
+        Arguments:
+            request: Incoming request.
+            entry: Cached response.
+        Returns:
+            Response to send.
+        """
+        use_gzip = entry.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", "")
+        etag = entry.gzip_etag if use_gzip else entry.etag
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"{'private' if self.private else 'public'}, max-age={self.max_age}",
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in client_etags or etag in client_etags:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=entry.gzip_body, media_type="application/json", headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def invalidate(self, model: type | None = None) -> None:
+        self._entries.clear()
+        self._invalidated_at = monotonic()
+        self._generation += 1
+
+
+response_cache = ResponseCache(
+    ttl=cache_settings.RESPONSE_CACHE_TTL,
+    max_age=cache_settings.RESPONSE_CACHE_MAX_AGE,
+    max_entries=cache_settings.RESPONSE_CACHE_MAX_ENTRIES,
+    settle_time=db_settings.DB_REPLICA_MAX_LAG if db_settings.DB_REPLICA_URLS else 0
+)
+
+# application statistics are read from counters changing with every application, so they are never invalidated
+# by writes and only expire after TTL; they are served to admins only and never stored by shared proxies
+stats_cache = ResponseCache(
+    ttl=cache_settings.STATS_CACHE_TTL,
+    max_age=cache_settings.STATS_CACHE_TTL,
+    max_entries=cache_settings.RESPONSE_CACHE_MAX_ENTRIES,
+    private=True
+)
+
+for portfolio_model in (Project, Image, Tag, ProjectTag):
+    register_write_listener(portfolio_model, response_cache.invalidate)
@@ -1,5 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Request
-
+from fastapi import APIRouter, HTTPException, status, Request, Response, Depends, Query, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_session, get_read_session
+from app.models import ServiceType, ClientType, BudgetType, DeadlineType
+from app.tg.notifier import application_notifier
+from app.web.cache import catalog_cache
+from app.web.ingest import application_queue, QueueFull
+from app.web.response_cache import response_cache
 from app.web.schemas import WebApplication
 from app.web.utils import verify_email, strip_phone_number, raise_bad_request
 
@@ -12,108 +19,136 @@ from app.web.db_manager import (
 router = APIRouter()
 
 @router.post("/apply", status_code=status.HTTP_201_CREATED)
-async def apply(data: WebApplication):
-    # verify user if in database by phone
+async def apply(
+        data: WebApplication,
+        response: Response,
+        background_tasks: BackgroundTasks,
+        session: AsyncSession = Depends(get_async_session)
+):
     # strip phone number and leave only digits
     phone_number = await strip_phone_number(data.phone)
-    user = await UserDBM.find_one_or_none(**{"phone": phone_number})
-    if not user:
-        if not await verify_email(data.email):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid email format: {data.email}",
-            )
-
-        user_info = {
-            "name": data.name,
-            "phone": phone_number,
-            "email": data.email,
-        }
-
-        user = await UserDBM.add(**user_info)
+    if not await verify_email(data.email):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid email format: {data.email}",
+        )
+
+    # user is created only if there is no user with this phone yet
+    user_info = {
+        "name": data.name,
+        "phone": phone_number,
+        "email": data.email,
+    }
 
     # preparing application data to be saved to database
+    # catalog ids are resolved from in-memory cache, no database round-trips needed;
+    # in queue mode stale cache is not waited for either, it is reloaded in background
+    wait = not application_queue.is_running
     # get service type id
-    service_type = await ServiceTypeDBM.find_one_or_none(**{"name": data.service_type})
-    if not service_type:
+    service_type_id = await catalog_cache.get_id(ServiceType, data.service_type, wait=wait)
+    if not service_type_id:
         await raise_bad_request("service type", data.service_type)
 
     # get client type id
-    client_type = await ClientTypeDBM.find_one_or_none(**{"name": data.client_type})
-    if not client_type:
+    client_type_id = await catalog_cache.get_id(ClientType, data.client_type, wait=wait)
+    if not client_type_id:
         await raise_bad_request("client type", data.client_type)
 
     # get budget type id
-    budget_type = await BudgetTypeDBM.find_one_or_none(**{"name": data.budget_type})
-    if not budget_type:
+    budget_type_id = await catalog_cache.get_id(BudgetType, data.budget_type, wait=wait)
+    if not budget_type_id:
         await raise_bad_request("budget type", data.budget_type)
 
     # get deadline type id
-    deadline_type = await DeadlineTypeDBM.find_one_or_none(**{"name": data.deadline_type})
-    if not deadline_type:
+    deadline_type_id = await catalog_cache.get_id(DeadlineType, data.deadline_type, wait=wait)
+    if not deadline_type_id:
         await raise_bad_request("deadline type", data.deadline_type)
 
     # assembling dict to save to applications
     application_info= {
-        "user_id": user.id,
-        "service_type_id": service_type.id,
-        "client_type_id": client_type.id,
-        "budget_type_id": budget_type.id,
-        "deadline_type_id": deadline_type.id,
+        "service_type_id": service_type_id,
+        "client_type_id": client_type_id,
+        "budget_type_id": budget_type_id,
+        "deadline_type_id": deadline_type_id,
         "client_name": data.name,
         "client_email": data.email,
         "client_phone": phone_number,
         "client_comment": data.comment,
     }
 
-    # adding data to database
-    new_application = await ApplicationDBM.add(**application_info)
+    # notification is queued only after response is sent, i.e. after application is committed or queued,
+    # it is sent to Telegram by background notifier and never delays the request
+    notification = {
+        "name": data.name,
+        "phone": phone_number,
+        "email": data.email,
+        "service_type": data.service_type,
+        "client_type": data.client_type,
+        "budget_type": data.budget_type,
+        "deadline_type": data.deadline_type,
+        "comment": data.comment,
+    }
+
+    # queue mode -> application is written by background worker in a batch with others
+    if application_queue.is_running:
+        try:
+            receipt = application_queue.put(user_info, application_info)
+        except QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many applications at the moment, please try again later",
+                headers={"Retry-After": "5"},
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+        background_tasks.add_task(application_notifier.notify, {"number": receipt[:8], **notification})
+        return {
+            "success": True,
+            "detail": f"application was accepted: {receipt}",
+            "receipt": receipt,
+        }
+
+    # adding user and application to database in one round-trip, statistics counters in another one
+    application_id = await ApplicationDBM.add_with_user(user_info, session=session, **application_info)
+    background_tasks.add_task(application_notifier.notify, {"number": f"#{application_id}", **notification})
 
     return {
         "success": True,
-        "detail": f"new application was created: #{new_application.id}",
+        "detail": f"new application was created: #{application_id}",
     }
 
 
-@router.get("/applications")
-async def get_app():
-    applications = await ApplicationDBM.find_all()
-    return applications
-
-
 # get information on projects
 @router.get("/projects")
-async def get_projects(project_id: int | None = None):
+async def get_projects(
+        request: Request,
+        project_id: int | None = None,
+        tag: list[str] = Query(default=[]),
+        q: str | None = Query(default=None, max_length=200),
+        limit: int | None = Query(default=None, ge=1, le=500),
+        offset: int = Query(default=0, ge=0),
+        session: AsyncSession = Depends(get_read_session)
+):
+    # serve already serialized response while portfolio data is unchanged
+    cached = response_cache.get(request)
+    if cached:
+        return response_cache.respond(request, cached)
+
     # if only one project requested, then provide one project only
     if project_id:
-        project = await ProjectDBM.find_one_with_relations_or_none_by_id(project_id)
+        project = await ProjectDBM.find_one_with_relations_or_none_by_id(project_id, session=session)
         if not project:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Project with id:{project_id} was not found"
             )
-        tag_ids = [tag.id for tag in project.tags]
-        tags = []
-        for i in tag_ids:
-            data = await TagDBM.find_one_or_none_by_id(i)
-            tags.append(data.name)
-        images = [image.image_url for image in project.images]
-
-        return {
-            "id": project.id,
-            "title": project.title,
-            "description": project.description,
-            "tags": tags,
-            "cover": project.cover,
-            "imgs": images,
-            "task": project.task,
-            "done": project.done,
-            "price": project.price
-        }
+        return response_cache.respond(request, response_cache.put(request, project))
     else:
-        # provide list of all projects
-        projects = await ProjectDBM.find_all_projects_with_relations()
-        return projects
-
-
-
+        # provide list of projects having all given tags and matching text query, all projects if none given
+        projects = await ProjectDBM.search(
+            tags=tag,
+            text=q.strip() if q else None,
+            limit=limit,
+            offset=offset,
+            session=session
+        )
+        return response_cache.respond(request, response_cache.put(request, projects))
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request, status
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+# accepted image types by file extension, jpeg is stored as jpg so that the same content gets the same name
+IMAGE_EXTENSIONS = {".jpg": ".jpg", ".jpeg": ".jpg", ".png": ".png", ".webp": ".webp", ".gif": ".gif", ".avif": ".avif"}
+# stored images and their resized variants are named by hash of their content, such files never change
+HASHED_NAME = re.compile(r"^(?P<stem>[0-9a-f]{32}(-\d+w)?)\.[a-z]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# limit of text fields sent together with the image
+MAX_FIELD_SIZE = 1024
+
+
+class ImageUpload:
+    """
+    Receives multipart upload of one image straight from the request stream.
+    File part is written to disk chunk by chunk and hashed on the way, nothing is buffered in memory,
+    then it is stored under name made of its content hash; file with the same content is stored only once.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.fields: dict[str, str] = {}
+        self.filename: str | None = None
+        self.extension: str | None = None
+        self.size = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._chunks: list[bytes] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field_name: str | None = None
+        self._field_data = bytearray()
+        self._is_file = False
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+        self._field_data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._field_name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._is_file = b"filename" in options
+        if not self._is_file:
+            return
+        if self._field_name != "file" or self.filename is not None:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Exactly one image is expected in field 'file'")
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        self.extension = IMAGE_EXTENSIONS.get(Path(self.filename).suffix.lower())
+        if self.extension is None:
+            raise HTTPException(
+                status.HTTP_400_BAD_REQUEST, f"Unsupported image type, expected one of: {', '.join(IMAGE_EXTENSIONS)}"
+            )
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        chunk = data[start:end]
+        if not self._is_file:
+            if len(self._field_data) + len(chunk) > MAX_FIELD_SIZE:
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, f"Field '{self._field_name}' is too long")
+            self._field_data.extend(chunk)
+            return
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Image is larger than {self.max_size} bytes")
+        self._hash.update(chunk)
+        self._chunks.append(chunk)
+
+    def on_part_end(self) -> None:
+        if not self._is_file:
+            self.fields[self._field_name] = self._field_data.decode("utf-8", "replace")
+
+    async def receive(self, request: Request) -> tuple[str, bool]:
+        """
+        Asynchronously reads upload request to the end and stores its image.
+        Arguments:
+            request: Upload request with multipart/form-data body, image in field "file".
+        Returns:
+            Name of stored file and whether it is new (False if the same image was already stored).
+        """
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Expected multipart/form-data body")
+        # declared size is checked before anything is read, actual size is checked while reading
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_size + 64 * 1024:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Image is larger than {self.max_size} bytes")
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+
+        # temporary file in the same directory, so that it is moved to its final name atomically
+        await aiofiles.os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.directory / f".upload-{uuid4().hex}.part"
+        try:
+            async with aiofiles.open(temp_path, "wb") as file:
+                async for chunk in request.stream():
+                    # parser callbacks can not await, file data they collected is written after every chunk
+                    parser.write(chunk)
+                    if self._chunks:
+                        await file.write(b"".join(self._chunks))
+                        self._chunks.clear()
+                parser.finalize()
+            if self.filename is None or self.size == 0:
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, "Image is expected in field 'file'")
+
+            name = f"{self._hash.hexdigest()}{self.extension}"
+            path = self.directory / name
+            if await aiofiles.os.path.exists(path):
+                await aiofiles.os.remove(temp_path)
+                return name, False
+            await aiofiles.os.replace(temp_path, path)
+            return name, True
+        except BaseException:
+            if await aiofiles.os.path.exists(temp_path):
+                await aiofiles.os.remove(temp_path)
+            raise
+
+
+class ImageFiles(StaticFiles):
+    """
+    Static files of project images. Uploaded images and their variants are named by hash of their content
+    and never change, so clients and proxies may cache them forever; the hashed name is also their strong ETag.
+    Other files are served as usual.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        match = HASHED_NAME.match(os.path.basename(full_path))
+        if match is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["etag"] = f'"{match.group("stem")}"'
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
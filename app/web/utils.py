@@ -1,4 +1,7 @@
 import re
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as BinasciiError
+from datetime import datetime
 from fastapi import HTTPException, status
 
 
@@ -20,3 +23,17 @@ async def raise_bad_request(model_type: str, value: any):
         status_code=status.HTTP_400_BAD_REQUEST,
         detail=f"Invalid {model_type}: {value}"
     )
+
+
+# opaque pagination cursor built from (created_at, id) of the last item on the page
+async def encode_cursor(cursor: tuple[datetime, int]) -> str:
+    created_at, data_id = cursor
+    return urlsafe_b64encode(f"{created_at.isoformat()}|{data_id}".encode()).decode()
+
+
+async def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, data_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(data_id)
+    except (BinasciiError, UnicodeDecodeError, ValueError):
+        await raise_bad_request("cursor", cursor)
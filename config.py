@@ -9,16 +9,95 @@ class DBSettings:
     DB_NAME = getenv("DB_NAME")
     DB_USER = getenv("DB_USER")
     DB_PASSWORD = getenv("DB_PASSWORD")
-    DB_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    # full url may be given directly, e.g. to point benchmarks to a disposable database
+    DB_URL = getenv("DB_URL", f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
+    # comma separated urls of read replicas, read-only queries are spread over them
+    DB_REPLICA_URLS = [url.strip() for url in getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+    # seconds replicas may lag behind primary, responses are not cached that long after a write
+    DB_REPLICA_MAX_LAG = float(getenv("DB_REPLICA_MAX_LAG", 5))
+    # connection pool
+    DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", 10))  # seconds to wait for free connection
+    DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", 1800))  # seconds before connection is replaced
+    DB_POOL_PRE_PING = getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_WARMUP = int(getenv("DB_POOL_WARMUP", 5))  # connections of every engine opened and primed at startup
+    # asyncpg
+    DB_STATEMENT_CACHE_SIZE = int(getenv("DB_STATEMENT_CACHE_SIZE", 100))  # prepared statements per connection
+    DB_STATEMENT_TIMEOUT = int(getenv("DB_STATEMENT_TIMEOUT", 30000))  # milliseconds, 0 disables timeout
+    # slow query log
+    DB_SLOW_QUERY_MS = int(getenv("DB_SLOW_QUERY_MS", 0))  # milliseconds, 0 disables log
+    DB_SLOW_QUERY_EXPLAIN = getenv("DB_SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    DB_SLOW_QUERY_LOG_SIZE = int(getenv("DB_SLOW_QUERY_LOG_SIZE", 100))
+
+class CacheSettings:
+    # seconds before in-memory catalog lookup tables are reloaded from database
+    CATALOG_CACHE_TTL = int(getenv("CATALOG_CACHE_TTL", 300))
+    # seconds serialized responses of public endpoints are kept in memory
+    RESPONSE_CACHE_TTL = int(getenv("RESPONSE_CACHE_TTL", 300))
+    # seconds clients may reuse public responses without revalidation
+    RESPONSE_CACHE_MAX_AGE = int(getenv("RESPONSE_CACHE_MAX_AGE", 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+    # seconds application statistics are served from memory, they are not invalidated by new applications
+    STATS_CACHE_TTL = int(getenv("STATS_CACHE_TTL", 60))
+
+class IngestSettings:
+    # accept applications into in-memory queue and write them in batches instead of one insert per request
+    APPLY_QUEUE_ENABLED = getenv("APPLY_QUEUE_ENABLED", "false").lower() == "true"
+    APPLY_QUEUE_SIZE = int(getenv("APPLY_QUEUE_SIZE", 10000))  # queued applications before 503 is returned
+    APPLY_BATCH_SIZE = int(getenv("APPLY_BATCH_SIZE", 500))  # applications written in one transaction
+    APPLY_FLUSH_INTERVAL_MS = int(getenv("APPLY_FLUSH_INTERVAL_MS", 50))  # longest time application waits in queue
+    # directory for applications which could not be written to database, they are written on next startup
+    APPLY_SPOOL_DIR = getenv("APPLY_SPOOL_DIR", "spool")
+
+class UploadSettings:
+    # directory served at /api/v1/web/images, uploaded images are stored there named by hash of their content
+    IMAGES_DIR = getenv("IMAGES_DIR", "app/web/images")
+    IMAGE_MAX_SIZE = int(getenv("IMAGE_MAX_SIZE", 20 * 1024 * 1024))  # bytes
+    # comma separated widths of resized variants generated for project images and covers
+    IMAGE_VARIANT_WIDTHS = [int(width) for width in getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",")]
+    # processes resizing images in background, 0 disables generation of variants in this server process
+    IMAGE_VARIANT_PROCESSES = int(getenv("IMAGE_VARIANT_PROCESSES", 1))
+
+class AdminSettings:
+    # token expected in X-Admin-Token header of admin API, admin API is disabled if not set
+    ADMIN_TOKEN = getenv("ADMIN_TOKEN")
+
+class ServerSettings:
+    HOST = getenv("SERVER_HOST", "localhost")
+    PORT = int(getenv("SERVER_PORT", 5050))
+    # worker processes, 0 -> one per CPU core; every worker has its own database pool and in-memory caches
+    WORKERS = int(getenv("SERVER_WORKERS", 1))
+    KEEP_ALIVE = int(getenv("SERVER_KEEP_ALIVE", 5))  # seconds idle connection is kept open
+    BACKLOG = int(getenv("SERVER_BACKLOG", 2048))  # pending connections not accepted yet
+    # concurrent connections per worker before 503 is returned, 0 -> unlimited
+    LIMIT_CONCURRENCY = int(getenv("SERVER_LIMIT_CONCURRENCY", 0))
+    # seconds in-flight requests are given to finish after SIGTERM
+    GRACEFUL_TIMEOUT = int(getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+    # comma separated addresses of reverse proxies trusted for X-Forwarded-* headers
+    FORWARDED_ALLOW_IPS = getenv("SERVER_FORWARDED_ALLOW_IPS", "127.0.0.1")
+    # level of log messages of app modules, uvicorn's own loggers keep their level
+    LOG_LEVEL = getenv("SERVER_LOG_LEVEL", "INFO").upper()
 
 class TGBotSettings:
     BOT_TOKEN = getenv("BOT_TOKEN")
     BASE_SITE = getenv("BASE_SITE")
     ADMIN_ID = getenv("ADMIN_ID")
+    # base url of Bot API server, e.g. local Bot API server or fake one in tests; api.telegram.org if not set
+    API_URL = getenv("TG_API_URL")
+    # seconds between notification messages, applications coming meanwhile are sent in one digest
+    NOTIFY_INTERVAL = float(getenv("TG_NOTIFY_INTERVAL", 10))
+    NOTIFY_QUEUE_SIZE = int(getenv("TG_NOTIFY_QUEUE_SIZE", 1000))  # pending notifications before new ones are dropped
+    NOTIFY_MAX_RETRIES = int(getenv("TG_NOTIFY_MAX_RETRIES", 5))  # attempts to send message before it is dropped
 
     def get_webhook_url(self) -> str:
         return f"{self.BASE_SITE}/webhook"
 
 
 db_settings = DBSettings()
+cache_settings = CacheSettings()
+ingest_settings = IngestSettings()
+upload_settings = UploadSettings()
+admin_settings = AdminSettings()
+server_settings = ServerSettings()
 bot_settings = TGBotSettings()
\ No newline at end of file
@@ -1,5 +1,33 @@
+import os
+from copy import deepcopy
+
 import uvicorn
-from app.app import app
+from uvicorn.config import LOGGING_CONFIG
+from config import server_settings
+
+
+def log_config() -> dict:
+    # uvicorn configures only its own loggers, messages of app modules are written by the same handler
+    config = deepcopy(LOGGING_CONFIG)
+    config["loggers"]["app"] = {"handlers": ["default"], "level": server_settings.LOG_LEVEL, "propagate": False}
+    return config
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="localhost", port=5050)
+    # uvicorn stops accepting connections on SIGTERM, waits for in-flight requests up to graceful timeout
+    # and runs lifespan shutdown of every worker
+    uvicorn.run(
+        "app.app:app",  # import string, so that every worker process imports app itself
+        host=server_settings.HOST,
+        port=server_settings.PORT,
+        workers=server_settings.WORKERS or os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+        timeout_keep_alive=server_settings.KEEP_ALIVE,
+        backlog=server_settings.BACKLOG,
+        limit_concurrency=server_settings.LIMIT_CONCURRENCY or None,
+        timeout_graceful_shutdown=server_settings.GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=server_settings.FORWARDED_ALLOW_IPS,
+        log_config=log_config(),
+    )
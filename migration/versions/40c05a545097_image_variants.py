@@ -0,0 +1,30 @@
+"""image variants
+
+Revision ID: 40c05a545097
+Revises: 97560475970f
+Create Date: 2026-10-18 17:04:12.583190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '40c05a545097'
+down_revision: Union[str, None] = '97560475970f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable columns without default, existing rows are not rewritten; their variants are generated in background
+    op.add_column("images", sa.Column("variants", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column("projects", sa.Column("cover_variants", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "cover_variants")
+    op.drop_column("images", "variants")
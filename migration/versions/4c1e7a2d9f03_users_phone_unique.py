@@ -0,0 +1,58 @@
+"""users phone unique
+
+Revision ID: 4c1e7a2d9f03
+Revises: 9b38baf31d67
+Create Date: 2026-10-18 10:12:41.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e7a2d9f03'
+down_revision: Union[str, None] = '9b38baf31d67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # merge users with the same phone into the oldest one, unique index can not be built otherwise
+    op.execute("""
+        WITH duplicates AS (
+            SELECT id, min(id) OVER (PARTITION BY phone) AS keep_id FROM users
+        )
+        UPDATE applications SET user_id = duplicates.keep_id
+        FROM duplicates
+        WHERE applications.user_id = duplicates.id AND duplicates.id <> duplicates.keep_id
+    """)
+    op.execute("""
+        WITH duplicates AS (
+            SELECT id, min(id) OVER (PARTITION BY phone) AS keep_id FROM users
+        )
+        UPDATE assignments SET worker_id = duplicates.keep_id
+        FROM duplicates
+        WHERE assignments.worker_id = duplicates.id AND duplicates.id <> duplicates.keep_id
+    """)
+    op.execute("""
+        DELETE FROM users
+        USING users AS kept
+        WHERE users.phone = kept.phone AND users.id > kept.id
+    """)
+
+    # index is built concurrently (outside of transaction), so users table stays writable
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_phone", "users", ["phone"],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_phone", table_name="users",
+            postgresql_concurrently=True, if_exists=True
+        )
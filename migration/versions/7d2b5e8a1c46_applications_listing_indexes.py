@@ -0,0 +1,38 @@
+"""applications listing indexes
+
+Revision ID: 7d2b5e8a1c46
+Revises: 4c1e7a2d9f03
+Create Date: 2026-10-18 11:03:27.092845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2b5e8a1c46'
+down_revision: Union[str, None] = '4c1e7a2d9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# keyset pagination of applications on (created_at, id), optionally filtered by status or service type
+indexes = {
+    "ix_applications_created_at_id": ["created_at", "id"],
+    "ix_applications_status_label_created_at_id": ["status_label", "created_at", "id"],
+    "ix_applications_service_type_id_created_at_id": ["service_type_id", "created_at", "id"],
+}
+
+
+def upgrade() -> None:
+    # indexes are built concurrently (outside of transaction), so applications table stays writable
+    with op.get_context().autocommit_block():
+        for name, columns in indexes.items():
+            op.create_index(name, "applications", columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in indexes:
+            op.drop_index(name, table_name="applications", postgresql_concurrently=True, if_exists=True)
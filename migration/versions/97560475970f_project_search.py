@@ -0,0 +1,63 @@
+"""project search
+
+Revision ID: 97560475970f
+Revises: a83f0c6d2e17
+Create Date: 2026-10-18 15:22:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '97560475970f'
+down_revision: Union[str, None] = 'a83f0c6d2e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+search_vector = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(task, '') || ' ' || coalesce(done, '')), 'C')"
+)
+
+# index name -> (table, columns, index method)
+# (tag_id, project_id) replaces ix_project_tags_tag_id, projects of a tag are read from index only
+indexes = {
+    "ix_projects_search_vector": ("projects", ["search_vector"], "gin"),
+    "ix_tags_name": ("tags", ["name"], "btree"),
+    "ix_project_tags_tag_id_project_id": ("project_tags", ["tag_id", "project_id"], "btree"),
+}
+
+
+def upgrade() -> None:
+    # generated column is filled for existing projects while table is rewritten
+    op.add_column(
+        "projects",
+        sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(search_vector, persisted=True), nullable=True)
+    )
+
+    # indexes are built concurrently (outside of transaction), so tables stay writable
+    with op.get_context().autocommit_block():
+        for name, (table, columns, using) in indexes.items():
+            op.create_index(
+                name, table, columns,
+                postgresql_using=using, postgresql_concurrently=True, if_not_exists=True
+            )
+        op.drop_index(
+            "ix_project_tags_tag_id", table_name="project_tags", postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_project_tags_tag_id", "project_tags", ["tag_id"], postgresql_concurrently=True, if_not_exists=True
+        )
+        for name, (table, columns, using) in indexes.items():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    op.drop_column("projects", "search_vector")
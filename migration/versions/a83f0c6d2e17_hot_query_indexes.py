@@ -0,0 +1,76 @@
+"""hot query indexes
+
+Revision ID: a83f0c6d2e17
+Revises: 7d2b5e8a1c46
+Create Date: 2026-10-18 12:41:09.638512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83f0c6d2e17'
+down_revision: Union[str, None] = '7d2b5e8a1c46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# catalog table -> applications column referencing it
+catalogs = {
+    "service_types": "service_type_id",
+    "client_types": "client_type_id",
+    "budget_types": "budget_type_id",
+    "deadline_types": "deadline_type_id",
+}
+
+# index name -> (table, columns, unique)
+# users.phone and status/date listing of applications are indexed by earlier revisions,
+# applications.service_type_id is covered by ix_applications_service_type_id_created_at_id,
+# project_tags.project_id is covered by project_tag_unique_id
+indexes = {
+    "ix_service_types_name": ("service_types", ["name"], True),
+    "ix_client_types_name": ("client_types", ["name"], True),
+    "ix_budget_types_name": ("budget_types", ["name"], True),
+    "ix_deadline_types_name": ("deadline_types", ["name"], True),
+    "ix_images_project_id": ("images", ["project_id"], False),
+    "ix_project_tags_tag_id": ("project_tags", ["tag_id"], False),
+    "ix_applications_user_id": ("applications", ["user_id"], False),
+    "ix_applications_client_type_id": ("applications", ["client_type_id"], False),
+    "ix_applications_budget_type_id": ("applications", ["budget_type_id"], False),
+    "ix_applications_deadline_type_id": ("applications", ["deadline_type_id"], False),
+}
+
+
+def upgrade() -> None:
+    # catalogs seeded more than once contain duplicated names:
+    # applications are moved to the oldest item with the same name, then duplicates are removed
+    for table, column in catalogs.items():
+        op.execute(f"""
+            WITH duplicates AS (
+                SELECT id, min(id) OVER (PARTITION BY name) AS keep_id FROM {table}
+            )
+            UPDATE applications SET {column} = duplicates.keep_id
+            FROM duplicates
+            WHERE applications.{column} = duplicates.id AND duplicates.id <> duplicates.keep_id
+        """)
+        op.execute(f"""
+            DELETE FROM {table}
+            USING {table} AS kept
+            WHERE {table}.name = kept.name AND {table}.id > kept.id
+        """)
+
+    # indexes are built concurrently (outside of transaction), so tables stay writable
+    with op.get_context().autocommit_block():
+        for name, (table, columns, unique) in indexes.items():
+            op.create_index(
+                name, table, columns,
+                unique=unique, postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, (table, columns, unique) in indexes.items():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,52 @@
+"""application stats
+
+Revision ID: b7d40e6c2f19
+Revises: e52f1b9c7a30
+Create Date: 2026-10-18 19:26:05.741093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d40e6c2f19'
+down_revision: Union[str, None] = 'e52f1b9c7a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "application_stats",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("dimension", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("day", "dimension", "key"),
+    )
+    # counters of already existing applications, later ones are counted as they are written;
+    # applications written by instances of the previous version during rollout are not counted here, counters are
+    # rebuilt by POST /api/v1/admin/applications/stats/rebuild once all instances run the new version
+    op.execute(
+        """
+        INSERT INTO application_stats (day, dimension, key, count)
+        SELECT applications.created_at::date, dimensions.dimension, dimensions.key, count(*)
+        FROM applications, LATERAL (VALUES
+            ('service_type', applications.service_type_id::text),
+            ('client_type', applications.client_type_id::text),
+            ('budget_type', applications.budget_type_id::text),
+            ('deadline_type', applications.deadline_type_id::text),
+            ('status_label', applications.status_label)
+        ) AS dimensions (dimension, key)
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("application_stats")
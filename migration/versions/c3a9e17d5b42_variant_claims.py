@@ -0,0 +1,29 @@
+"""variant claims
+
+Revision ID: c3a9e17d5b42
+Revises: b7d40e6c2f19
+Create Date: 2026-10-18 21:08:51.204716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9e17d5b42'
+down_revision: Union[str, None] = 'b7d40e6c2f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable columns without default, existing rows are not rewritten
+    op.add_column("images", sa.Column("variants_claimed_at", sa.DateTime(), nullable=True))
+    op.add_column("projects", sa.Column("cover_variants_claimed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "cover_variants_claimed_at")
+    op.drop_column("images", "variants_claimed_at")
@@ -0,0 +1,40 @@
+"""worker assignments index
+
+Revision ID: e52f1b9c7a30
+Revises: 40c05a545097
+Create Date: 2026-10-18 18:12:40.318264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e52f1b9c7a30'
+down_revision: Union[str, None] = '40c05a545097'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keyset pagination of worker's assignments on (created_at, application_id), built without blocking claims
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_assignments_worker_id_created_at_application_id",
+            "assignments",
+            ["worker_id", "created_at", "application_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_assignments_worker_id_created_at_application_id",
+            table_name="assignments",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
@@ -0,0 +1,31 @@
+"""regenerate legacy variants
+
+Revision ID: f4a8c2e61d07
+Revises: c3a9e17d5b42
+Create Date: 2026-10-18 23:41:12.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a8c2e61d07'
+down_revision: Union[str, None] = 'c3a9e17d5b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# uploaded originals are named by content hash, variants of other files were named by file name and could collide
+HASHED_NAME = r"'(^|/)[0-9a-f]{32}\.[a-z]+$'"
+
+
+def upgrade() -> None:
+    # variants are generated again in background under content hash names
+    op.execute(f"UPDATE images SET variants = NULL WHERE variants IS NOT NULL AND image_url !~ {HASHED_NAME}")
+    op.execute(f"UPDATE projects SET cover_variants = NULL WHERE cover_variants IS NOT NULL AND cover !~ {HASHED_NAME}")
+
+
+def downgrade() -> None:
+    # variant names of the previous version can not be restored
+    pass
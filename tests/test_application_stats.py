@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from tests.conftest import ADMIN_HEADERS
+
+
+def stats_and_truth(client) -> tuple[set, set]:
+    from app.database import session_scope
+    from app.models import Application, ApplicationStat
+    from app.web.db_manager import STAT_DIMENSIONS
+
+    async def read() -> tuple[set, set]:
+        async with session_scope() as session:
+            result = await session.execute(
+                select(ApplicationStat.day, ApplicationStat.dimension, ApplicationStat.key, ApplicationStat.count)
+                .where(ApplicationStat.count != 0)
+            )
+            stats = set(result.all())
+            truth = set()
+            for dimension, column in STAT_DIMENSIONS.items():
+                day = func.date(Application.created_at)
+                result = await session.execute(
+                    select(day, getattr(Application, column), func.count()).group_by(day, getattr(Application, column))
+                )
+                truth.update((day, dimension, str(key), count) for day, key, count in result.all())
+        return stats, truth
+
+    return client.portal.call(read)
+
+
+def test_counters_follow_every_write(client):
+    from app.models import STATUS_ASSIGNED
+    from app.web.db_manager import ApplicationDBM, UserDBM
+
+    catalogs = {"service_type_id": 2, "client_type_id": 3, "budget_type_id": 1, "deadline_type_id": 4}
+    contact = {"client_name": "client", "client_phone": "79000000000", "client_email": "client@mail.ru"}
+
+    async def write() -> None:
+        user = await UserDBM.add(name="client", phone="stats client")
+        application = await ApplicationDBM.add(user_id=user.id, **contact, **catalogs)
+        # older applications are counted on the day they were created
+        await ApplicationDBM.add_many([
+            {"user_id": user.id, "created_at": datetime.now() - timedelta(days=days), **contact, **catalogs}
+            for days in (1, 1, 3)
+        ])
+        await ApplicationDBM.update_by_id(application.id, status_label=STATUS_ASSIGNED, service_type_id=1)
+        await ApplicationDBM.add_with_user({"name": "client", "phone": "stats client"}, **contact, **catalogs)
+        # existing application is moved between counters, new one is added
+        await ApplicationDBM.upsert_many([
+            {"id": application.id, "user_id": user.id, **contact, **catalogs, "status_label": "done"},
+            {"id": 10 ** 9, "user_id": user.id, **contact, **catalogs, "status_label": "done"},
+        ], index_elements=["id"])
+
+    client.portal.call(write)
+
+    stats, truth = stats_and_truth(client)
+    assert stats == truth
+
+
+def test_counters_are_rebuilt_from_applications(client):
+    from app.database import session_scope
+    from app.models import ApplicationStat
+
+    async def lose_counters() -> None:
+        # as if applications were written by instances not maintaining the counters
+        async with session_scope() as session:
+            await session.execute(ApplicationStat.__table__.delete().where(ApplicationStat.dimension == "client_type"))
+            await session.execute(ApplicationStat.__table__.update().values(count=ApplicationStat.count + 5))
+
+    client.portal.call(lose_counters)
+    assert stats_and_truth(client)[0] != stats_and_truth(client)[1]
+
+    response = client.post("/api/v1/admin/applications/stats/rebuild", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    stats, truth = stats_and_truth(client)
+    assert stats == truth
+    assert response.json()["total"] == sum(count for _, dimension, _, count in truth if dimension == "status_label")
+
+
+def test_stats_endpoint(client):
+    assert client.get("/api/v1/admin/applications/stats").status_code == 403
+    response = client.get("/api/v1/admin/applications/stats", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("private")
+    stats = response.json()
+    assert stats["total"] == sum(day["count"] for day in stats["daily"])
+    assert sum(stats["counts"]["status_label"].values()) == stats["total"]
+    assert "брендинг" in stats["counts"]["service_type"]
+
+
+def test_applications_are_not_public(client):
+    for path in ("/applications", "/applications/export", "/applications/stats"):
+        assert client.get(f"/api/v1/web{path}").status_code in (404, 405)
+        assert client.get(f"/api/v1/admin{path}").status_code == 403
+    assert client.get("/api/v1/admin/applications", headers=ADMIN_HEADERS).status_code == 200
@@ -0,0 +1,67 @@
+import asyncio
+
+from app.models import ServiceType
+from app.web.cache import CatalogCache
+
+
+def stale_cache() -> tuple[CatalogCache, list]:
+    cache = CatalogCache(ttl=60)
+    cache._ids[ServiceType] = {"брендинг": 1}
+    cache._loaded_at = float("-inf")
+    loads = []
+
+    async def load(force: bool = True) -> None:
+        loads.append("started")
+        await asyncio.sleep(0.01)
+        loads.append("finished")
+
+    cache.load = load
+    return cache, loads
+
+
+def test_lookup_without_wait_uses_memory_and_refreshes_in_background():
+    cache, loads = stale_cache()
+
+    async def lookup() -> tuple[int | None, list]:
+        data_id = await cache.get_id(ServiceType, "брендинг", wait=False)
+        seen = list(loads)
+        await cache._refresh
+        return data_id, seen
+
+    data_id, loads_during_lookup = asyncio.run(lookup())
+    assert data_id == 1
+    assert "finished" not in loads_during_lookup
+    assert loads == ["started", "finished"]
+
+
+def test_lookup_waits_for_reload_by_default():
+    cache, loads = stale_cache()
+
+    assert asyncio.run(cache.get_id(ServiceType, "брендинг")) == 1
+    assert loads == ["started", "finished"]
+
+
+def test_load_interrupted_by_invalidation_stays_stale(monkeypatch):
+    cache = CatalogCache(ttl=60)
+
+    class Result:
+        def all(self) -> list:
+            return [("брендинг", 1)]
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return None
+
+        async def execute(self, query):
+            # catalog is written while the load reads it
+            cache.invalidate()
+            return Result()
+
+    monkeypatch.setattr("app.web.cache.async_session_maker", Session)
+
+    asyncio.run(cache.load())
+    assert cache.is_stale
+    assert cache._ids[ServiceType] == {"брендинг": 1}
@@ -0,0 +1,82 @@
+import asyncio
+
+from PIL import Image as PILImage
+
+from app.web.imaging import make_variants
+
+
+def test_claims_are_exclusive_expire_and_are_released(client):
+    from app.web.db_manager import ProjectDBM, ImageDBM
+
+    async def scenario() -> None:
+        project = await ProjectDBM.add(title="claims")
+        images = await ImageDBM.add_many([
+            {"project_id": project.id, "name": f"image {i}", "image_url": f"claims-{i}.png"} for i in range(3)
+        ])
+        ids = {image.id for image in images}
+
+        # concurrent claims never get the same image
+        first, second = await asyncio.gather(
+            ImageDBM.claim_without_variants(2, lease=600), ImageDBM.claim_without_variants(2, lease=600)
+        )
+        first, second = {row.id for row in first} & ids, {row.id for row in second} & ids
+        assert first | second == ids
+        assert not first & second
+        assert not {row.id for row in await ImageDBM.claim_without_variants(10, lease=600)} & ids
+
+        # claims of a process which did not save variants expire
+        reclaimed = {row.id: row.image_url for row in await ImageDBM.claim_without_variants(10, lease=0)}
+        assert ids <= set(reclaimed)
+
+        image_id = min(ids)
+        # image changed while it was resized, variants of the old file are not saved
+        assert not await ImageDBM.save_variants(image_id, "other.png", {"webp": {}})
+        assert await ImageDBM.save_variants(image_id, reclaimed[image_id], {"webp": {}})
+        assert not {row.id for row in await ImageDBM.claim_without_variants(10, lease=0)} & {image_id}
+
+    client.portal.call(scenario)
+
+
+def test_variants_of_originals_with_the_same_name_do_not_collide(tmp_path):
+    for project, color in (("p1", "red"), ("p2", "blue")):
+        (tmp_path / project).mkdir()
+        PILImage.new("RGB", (40, 20), color).save(tmp_path / project / "cover.png")
+    PILImage.new("RGB", (40, 20), "green").save(tmp_path / "cover.jpg")
+
+    variants = [make_variants(str(tmp_path), name, [20]) for name in ("p1/cover.png", "p2/cover.png", "cover.jpg")]
+
+    names = [image_variants["webp"]["20"] for image_variants in variants]
+    assert len(set(names)) == 3
+    with PILImage.open(tmp_path / variants[0]["jpeg"]["20"]) as image:
+        assert image.convert("RGB").getpixel((10, 5))[0] > 200
+
+
+def test_response_cache_is_invalidated_once_per_drained_backlog(monkeypatch):
+    from app.web import derivatives
+
+    pipeline = derivatives.DerivativePipeline(directory="", widths=[320], processes=0)
+    batches = [derivatives.BATCH_SIZE] * 3 + [0]
+    invalidations = []
+
+    async def process_images() -> int:
+        pipeline._saved += batches[0]
+        return batches.pop(0)
+
+    async def process_covers() -> int:
+        return 0
+
+    monkeypatch.setattr(pipeline, "process_images", process_images)
+    monkeypatch.setattr(pipeline, "process_covers", process_covers)
+    monkeypatch.setattr(derivatives.response_cache, "invalidate", lambda model=None: invalidations.append(model))
+
+    async def drain() -> None:
+        pipeline._wakeup = asyncio.Event()
+        pipeline._wakeup.set()
+        worker = asyncio.create_task(pipeline.run())
+        while batches:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        worker.cancel()
+
+    asyncio.run(drain())
+    assert invalidations == [None]
@@ -0,0 +1,80 @@
+import fcntl
+import json
+import threading
+
+from app.web.ingest import ApplicationQueue, append_to_spool
+
+
+def spooled(index: int) -> str:
+    phone = f"7955000{index:04d}"
+    return json.dumps({
+        "receipt": f"receipt {index}",
+        "user": {"name": "client", "phone": phone, "email": "client@mail.ru"},
+        "application": {
+            "client_name": "client", "client_phone": phone, "client_email": "client@mail.ru",
+            "service_type_id": 1, "client_type_id": 1, "budget_type_id": 1, "deadline_type_id": 1,
+        },
+    }) + "\n"
+
+
+def make_queue(spool_dir) -> ApplicationQueue:
+    return ApplicationQueue(max_size=10, batch_size=10, flush_interval=0.01, spool_dir=str(spool_dir))
+
+
+def test_replay_writes_good_files_and_puts_malformed_aside(client, tmp_path):
+    (tmp_path / "applications-1.ndjson").write_text(spooled(1) + spooled(2))
+    (tmp_path / "applications-2.ndjson").write_text(spooled(3) + "{not json\n")
+
+    assert client.portal.call(make_queue(tmp_path).replay_spool) is True
+
+    assert not list(tmp_path.glob("*.ndjson"))
+    assert len(list(tmp_path.glob("applications-2-*.failed"))) == 1
+
+
+def test_replay_keeps_file_when_database_fails(client, tmp_path, monkeypatch):
+    from app.web.db_manager import ApplicationDBM
+
+    async def database_down(*args, **kwargs):
+        raise ConnectionRefusedError
+
+    monkeypatch.setattr(ApplicationDBM, "add_many_with_users", database_down)
+    (tmp_path / "applications-1.ndjson").write_text(spooled(4))
+
+    # startup goes on, file is replayed later
+    assert client.portal.call(make_queue(tmp_path).replay_spool) is False
+    assert (tmp_path / "applications-1.ndjson").read_text() == spooled(4)
+
+
+def test_replay_skips_file_locked_by_another_worker(client, tmp_path):
+    path = tmp_path / "applications-1.ndjson"
+    path.write_text(spooled(5))
+
+    with open(path) as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        assert client.portal.call(make_queue(tmp_path).replay_spool) is False
+
+    assert path.read_text() == spooled(5)
+
+
+def test_replay_picks_up_files_left_by_crashed_replay(client, tmp_path):
+    (tmp_path / "applications-1.replaying").write_text(spooled(6))
+
+    assert client.portal.call(make_queue(tmp_path).replay_spool) is True
+    assert not list(tmp_path.iterdir())
+
+
+def test_spool_starts_new_file_when_waited_file_was_replayed(tmp_path):
+    path = tmp_path / "applications-1.ndjson"
+    path.write_text(spooled(7))
+
+    with open(path) as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        writer = threading.Thread(target=append_to_spool, args=(path, spooled(8)))
+        writer.start()
+        # writer waits for the lock of the replaying worker, which writes and removes the file
+        writer.join(0.1)
+        assert writer.is_alive()
+        path.unlink()
+    writer.join()
+
+    assert path.read_text() == spooled(8)
@@ -0,0 +1,47 @@
+from app.tg.notifier import format_digest, MESSAGE_LIMIT, MAX_LISTED
+
+
+def application(**fields) -> dict:
+    return {
+        "number": "#1", "name": "Дмитрий", "phone": "79996669966", "email": "dimka@mail.ru",
+        "service_type": "брендинг", "client_type": "авто", "budget_type": "до 50 000", "deadline_type": "1 месяц",
+        "comment": "новый бренд в минимализме", **fields
+    }
+
+
+def test_digest_of_long_applications_fits_message_limit():
+    events = [application(name="Д" * 5000, email="e" * 5000, comment="к" * 5000) for _ in range(40)]
+
+    text = format_digest(events, dropped=3)
+
+    assert len(text) <= MESSAGE_LIMIT
+    listed = text.count("Заявка")
+    assert 0 < listed < MAX_LISTED
+    assert text.endswith(f"...и ещё {len(events) - listed + 3}")
+
+
+def test_digest_lists_short_applications_up_to_limit():
+    text = format_digest([application() for _ in range(20)], dropped=0)
+
+    assert text.count("Заявка") == MAX_LISTED
+    assert text.endswith(f"...и ещё {20 - MAX_LISTED}")
+
+
+def test_notify_runs_on_event_loop():
+    import asyncio
+    import inspect
+    from app.tg.notifier import ApplicationNotifier
+
+    notifier = ApplicationNotifier(token="token", chat_id="1", api_url=None, interval=60, max_size=1, max_retries=1)
+    # background tasks run plain functions in threadpool, where the queue must not be touched
+    assert inspect.iscoroutinefunction(notifier.notify)
+
+    async def fill() -> int:
+        notifier._queue = asyncio.Queue(maxsize=1)
+        notifier._worker = asyncio.current_task()
+        await notifier.notify(application())
+        await notifier.notify(application())
+        return notifier._queue.qsize()
+
+    assert asyncio.run(fill()) == 1
+    assert notifier._dropped == 1
@@ -0,0 +1,53 @@
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app.models import Application, Image
+from app.slow_queries import LOCKING_CLAUSE
+
+
+def compile_statement(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_locking_reads_are_not_explained():
+    assert LOCKING_CLAUSE.search(compile_statement(select(Application.id).with_for_update()))
+    assert LOCKING_CLAUSE.search(compile_statement(select(Image.id).with_for_update(skip_locked=True)))
+    assert LOCKING_CLAUSE.search(compile_statement(select(Image.id).with_for_update(read=True)))
+    assert LOCKING_CLAUSE.search(compile_statement(select(Image.id).with_for_update(key_share=True)))
+
+
+def test_plain_reads_are_explained():
+    assert not LOCKING_CLAUSE.search(compile_statement(select(Application.id).where(Application.id == 1)))
+
+
+def test_plan_does_not_contain_parameter_values(client):
+    from sqlalchemy import event
+
+    from app.database import engine
+    from app.models import User
+    from app.slow_queries import SlowQueryLog
+
+    executed = []
+
+    def remember(conn, cursor, statement, parameters, context, executemany) -> None:
+        executed.append((statement, parameters))
+
+    async def explain() -> dict:
+        event.listen(engine.sync_engine, "before_cursor_execute", remember)
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(select(User.id).where(User.phone == "79991234567", User.id > 3).limit(5))
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", remember)
+        statement, parameters = executed[-1]
+        entry = {"plan": None}
+        await SlowQueryLog(threshold_ms=1, explain=True, size=1).capture_plan(engine, entry, statement, parameters)
+        # nothing is left prepared on the pooled connection
+        async with engine.connect() as conn:
+            prepared = await conn.exec_driver_sql("SELECT count(*) FROM pg_prepared_statements WHERE from_sql")
+            assert prepared.scalar() == 0
+        return entry
+
+    plan = client.portal.call(explain)["plan"]
+    assert "users" in plan and "$1" in plan
+    assert "79991234567" not in plan
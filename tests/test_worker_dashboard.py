@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import event
+
+from tests.conftest import ADMIN_HEADERS
+
+# assignments of the worker with many of them, listed on one page
+MANY = 12
+
+
+def count_statements(client, call) -> int:
+    from app.database import engine
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+
+@pytest.fixture(scope="module")
+def workers(client):
+    from app.models import WORKER_USER_TYPE
+    from app.web.db_manager import UserDBM, ApplicationDBM
+
+    async def seed() -> dict[int, int]:
+        catalogs = {"service_type_id": 1, "client_type_id": 1, "budget_type_id": 1, "deadline_type_id": 1}
+        await ApplicationDBM.add_many_with_users([
+            (
+                {"name": f"client {i}", "phone": f"7900000{i:04d}", "email": f"client{i}@mail.ru"},
+                {"client_name": f"client {i}", "client_phone": f"7900000{i:04d}",
+                 "client_email": f"client{i}@mail.ru", **catalogs}
+            )
+            for i in range(MANY + 1)
+        ])
+        assignments = {}
+        for name, count in (("one", 1), ("many", MANY)):
+            worker = await UserDBM.add(name=name, phone=f"worker {name}", user_type=WORKER_USER_TYPE)
+            await ApplicationDBM.claim_next(worker.id, limit=count)
+            assignments[worker.id] = count
+        return assignments
+
+    return client.portal.call(seed)
+
+
+@pytest.mark.parametrize("count", [1, MANY])
+def test_worker_page_is_one_statement(client, workers, count):
+    from app.web.db_manager import AssignmentDBM
+
+    worker_id = next(worker_id for worker_id, assigned in workers.items() if assigned == count)
+    pages = []
+
+    statements = count_statements(
+        client, lambda: pages.append(client.portal.call(AssignmentDBM.find_worker_page, worker_id, count))
+    )
+
+    items, next_cursor = pages[0]
+    assert len(items) == count
+    assert next_cursor is None
+    # serializing the page must not load anything lazily
+    assert all(item["client"]["name"] and item["application"]["service_type"] for item in items)
+    assert statements == 1
+
+
+@pytest.mark.parametrize("count", [1, MANY])
+def test_worker_dashboard_statements(client, workers, count):
+    worker_id = next(worker_id for worker_id, assigned in workers.items() if assigned == count)
+    responses = []
+
+    statements = count_statements(client, lambda: responses.append(client.get(
+        f"/api/v1/admin/workers/{worker_id}/assignments", params={"limit": count}, headers=ADMIN_HEADERS
+    )))
+
+    assert responses[0].status_code == 200
+    assert len(responses[0].json()["items"]) == count
+    # worker check and the page itself
+    assert statements == 2